@@ -0,0 +1,197 @@
+"""Benchmark MimicStickerMaker over the image corpus.
+
+Each case runs in a fresh process so that peak RSS only covers one conversion.
+Results are written as JSON, pass a previous result file to --compare to see
+how wall time and output size changed.
+
+    python benchmarks/sticker/bench_sticker.py --output bench.json
+    python benchmarks/sticker/bench_sticker.py --compare bench.json
+
+Only the sticker pipeline is imported, so the bot's environment variables are
+not needed. Install requirements.txt first, the pipeline needs Pillow, numpy and
+pycairo.
+
+Stage timings: decode covers StickerSource creation, sources too large to keep
+decoded frames are decoded again during bbox and transform instead. thumbnail
+is the time spent in the thumbnail thread, it overlaps with transform and
+encode and is not part of the total.
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from itertools import product
+from pathlib import Path
+from time import perf_counter
+
+ROOT = Path(__file__).resolve().parents[2]
+CORPUS_DIR = Path(__file__).parent / "corpus"
+
+AUTO_CROP = (True, False)
+PADDING = (-0.2, 0.0, 0.2)
+ROUNDNESS = (0.0, 0.5, 1.0)
+# 与面板中的选项一致
+FULL_PADDING = tuple(v / 100 for v in range(-50, 55, 5))
+FULL_ROUNDNESS = tuple(v / 100 for v in range(0, 105, 5))
+
+
+def _max_rss():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _run_case(path: Path, auto_crop: bool, padding: float, roundness: float):
+    sys.path.insert(0, str(ROOT))
+    from PIL import Image
+
+    from cogs.tools.sticker_maker import MimicStickerMaker, StickerSource
+
+    data = path.read_bytes()
+    base_rss = _max_rss()
+    maker = MimicStickerMaker(auto_crop=auto_crop, padding=padding, roundness=roundness)
+    # 统计主图像的编码耗时，转换耗时为制作总耗时减去编码耗时
+    # 缩略图在另一个线程中编码，单独统计，不计入主图像的编码耗时
+    encode_time = thumbnail_time = 0.0
+    encode_frame = maker._encode_frame
+    encode_thumbnail = maker._encode_thumbnail
+
+    def timed_encode(frame):
+        nonlocal encode_time
+        if threading.current_thread() is not threading.main_thread():
+            return encode_frame(frame)
+        start = perf_counter()
+        result = encode_frame(frame)
+        encode_time += perf_counter() - start
+        return result
+
+    def timed_thumbnail(frame):
+        nonlocal thumbnail_time
+        start = perf_counter()
+        result = encode_thumbnail(frame)
+        thumbnail_time += perf_counter() - start
+        return result
+
+    maker._encode_frame = timed_encode
+    maker._encode_thumbnail = timed_thumbnail
+
+    t0 = perf_counter()
+    source = StickerSource(Image.open(io.BytesIO(data)))
+    t1 = perf_counter()
+    if auto_crop:
+        source.get_bbox()
+    t2 = perf_counter()
+    sticker, thumbnail = maker.make_sticker(source, thumbnail=True)
+    t3 = perf_counter()
+
+    return {
+        "file": path.name,
+        "input_bytes": len(data),
+        "auto_crop": auto_crop,
+        "padding": padding,
+        "roundness": roundness,
+        "stages": {
+            "decode": t1 - t0,
+            "bbox": t2 - t1,
+            "transform": t3 - t2 - encode_time,
+            "encode": encode_time,
+            "thumbnail": thumbnail_time,
+        },
+        "total": t3 - t0,
+        "peak_rss": _max_rss(),
+        "peak_rss_delta": _max_rss() - base_rss,
+        "output_bytes": len(sticker.getvalue()),
+        "thumbnail_bytes": len(thumbnail.getvalue()),
+    }
+
+
+def _git_commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return result.stdout.strip()
+    except Exception:
+        return None
+
+
+def run(files: list[Path], *, full: bool = False):
+    import PIL
+
+    padding = FULL_PADDING if full else PADDING
+    roundness = FULL_ROUNDNESS if full else ROUNDNESS
+    cases = list(product(files, AUTO_CROP, padding, roundness))
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for i, case in enumerate(cases, 1):
+        with ctx.Pool(1) as pool:
+            result = pool.apply(_run_case, case)
+        results.append(result)
+        print(
+            f"[{i}/{len(cases)}] {result['file']} crop={result['auto_crop']} "
+            f"pad={result['padding']} round={result['roundness']}: "
+            f"{result['total'] * 1000:.0f}ms {result['output_bytes'] // 1024}KB",
+            file=sys.stderr,
+        )
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def _case_key(result: dict):
+    return (result["file"], result["auto_crop"], result["padding"], result["roundness"])
+
+
+def compare(current: dict, baseline: dict):
+    # 输出每种情况相对于基准的耗时和输出大小变化
+    base = {_case_key(r): r for r in baseline["results"]}
+    for r in current["results"]:
+        b = base.get(_case_key(r))
+        if b is None:
+            continue
+        time_ratio = r["total"] / b["total"] if b["total"] else float("inf")
+        size_ratio = r["output_bytes"] / b["output_bytes"] if b["output_bytes"] else float("inf")
+        print(
+            f"{r['file']:<20} crop={r['auto_crop']!s:<5} pad={r['padding']:<5} "
+            f"round={r['roundness']:<4} time x{time_ratio:.2f} size x{size_ratio:.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", type=Path, help="images to run, default the whole corpus")  # fmt: skip
+    parser.add_argument("--full", action="store_true", help="use every padding and roundness step")  # fmt: skip
+    parser.add_argument("--output", type=Path, help="write JSON results to this file")
+    parser.add_argument("--compare", type=Path, help="compare with a previous JSON result")
+    args = parser.parse_args()
+
+    files = args.files or sorted(p for p in CORPUS_DIR.iterdir() if p.is_file())
+    current = run(files, full=args.full)
+    if args.output:
+        args.output.write_text(json.dumps(current, indent=2))
+    elif not args.compare:
+        print(json.dumps(current, indent=2))
+    if args.compare:
+        compare(current, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Generate the image corpus used by bench_sticker.py.
+
+The generated files are committed, run this script again only when the
+corpus itself needs to change.
+"""
+
+import math
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+CORPUS_DIR = Path(__file__).parent / "corpus"
+
+
+def _gradient(w: int, h: int, t: float = 0.0):
+    yy, xx = np.mgrid[0:h, 0:w]
+    rgb = np.empty((h, w, 3), dtype=np.uint8)
+    rgb[..., 0] = (xx * 255 // max(w - 1, 1) + int(t * 80)) % 256
+    rgb[..., 1] = (yy * 255 // max(h - 1, 1)) % 256
+    rgb[..., 2] = (128 + 100 * np.sin(xx / 23 + yy / 17 + t)).astype(np.uint8)
+    return rgb
+
+
+def _blob_alpha(w: int, h: int, t: float = 0.0, *, specks: bool = False):
+    # 中间一个移动的圆形，周围是透明区域，可选地加入噪点测试自动裁剪的去噪
+    yy, xx = np.mgrid[0:h, 0:w]
+    cx = w / 2 + w / 6 * math.sin(t)
+    cy = h / 2 + h / 8 * math.cos(t)
+    r = min(w, h) / 3
+    alpha = ((xx - cx) ** 2 + (yy - cy) ** 2 < r**2).astype(np.uint8) * 255
+    if specks:
+        rng = np.random.default_rng(42)
+        ys, xs = rng.integers(0, h, 40), rng.integers(0, w, 40)
+        alpha[ys, xs] = 255
+    return alpha
+
+
+def _rgba(w: int, h: int, t: float = 0.0, *, specks: bool = False):
+    return Image.fromarray(np.dstack([_gradient(w, h, t), _blob_alpha(w, h, t, specks=specks)]))
+
+
+def make_corpus():
+    CORPUS_DIR.mkdir(exist_ok=True)
+    # 静态图像
+    Image.fromarray(_gradient(128, 128)).save(CORPUS_DIR / "static_small.png")
+    Image.fromarray(_gradient(1024, 768)).save(CORPUS_DIR / "static_large.png")
+    _rgba(512, 512, specks=True).save(CORPUS_DIR / "transparent.png")
+    _rgba(512, 384).save(CORPUS_DIR / "transparent.webp", quality=80)
+    Image.fromarray(_gradient(512, 512)).save(CORPUS_DIR / "static.avif", quality=60)
+
+    # 调色板GIF，包含重复帧
+    frames = [_rgba(240, 240, i // 2 * 0.4).convert("P") for i in range(24)]
+    frames[0].save(
+        CORPUS_DIR / "palette.gif",
+        save_all=True,
+        append_images=frames[1:],
+        duration=60,
+        loop=0,
+        disposal=2,
+    )
+    # 长动画GIF，纯色背景上移动的色块
+    frames = []
+    for i in range(240):
+        f = Image.new("P", (200, 150), 0)
+        f.putpalette([30, 30, 40, 220, 80, 60, 60, 160, 220])
+        x, y = 20 + i * 130 // 240, 40 + int(40 * math.sin(i / 12))
+        f.paste(1 + i // 40 % 2, (x, y, x + 50, y + 50))
+        frames.append(f)
+    frames[0].save(
+        CORPUS_DIR / "long.gif",
+        save_all=True,
+        append_images=frames[1:],
+        duration=40,
+        loop=0,
+    )
+    # 带透明通道的APNG，PIL读取的帧时长为浮点数
+    frames = [_rgba(160, 160, i * 0.3) for i in range(20)]
+    frames[0].save(
+        CORPUS_DIR / "animated.png",
+        save_all=True,
+        append_images=frames[1:],
+        duration=[33.3 + i % 3 for i in range(20)],
+        loop=0,
+    )
+    # 带透明通道的动画WebP
+    frames = [_rgba(400, 400, i * 0.2) for i in range(48)]
+    frames[0].save(
+        CORPUS_DIR / "animated.webp",
+        save_all=True,
+        append_images=frames[1:],
+        duration=50,
+        loop=0,
+        quality=70,
+    )
+
+
+if __name__ == "__main__":
+    make_corpus()
+    for path in sorted(CORPUS_DIR.iterdir()):
+        print(f"{path.name}: {path.stat().st_size // 1024}KB")
@@ -0,0 +1,45 @@
+from collections import OrderedDict
+from typing import Generic, Hashable, TypeVar, overload
+
+__all__ = ("LRUCache",)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+T = TypeVar("T")
+
+
+class LRUCache(Generic[K, V]):
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._data: OrderedDict[K, V] = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: K):
+        return key in self._data
+
+    @overload
+    def get(self, key: K, default: None = None) -> V | None: ...
+    @overload
+    def get(self, key: K, default: T) -> V | T: ...
+
+    def get(self, key, default=None):
+        if key not in self._data:
+            return default
+        # 最近访问的移到末尾
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def __setitem__(self, key: K, value: V):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        # 超出容量时移除最久未访问的
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K, default: V | None = None):
+        return self._data.pop(key, default)
+
+    def clear(self):
+        self._data.clear()
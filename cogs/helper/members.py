@@ -0,0 +1,105 @@
+from bisect import bisect_left, insort
+from math import inf
+
+from discord import Guild, Member
+
+__all__ = (
+    "MemberIndex",
+    "member_index",
+)
+
+_JoinKey = tuple[float, int]
+
+
+def _join_key(member: Member) -> _JoinKey:
+    # 按加入时间排序，时间未知的排在最后，时间相同时按id排序
+    joined = member.joined_at.timestamp() if member.joined_at else inf
+    return joined, member.id
+
+
+class _GuildMembers:
+    def __init__(self, members: list[Member]):
+        self.keys: dict[int, _JoinKey] = {m.id: _join_key(m) for m in members if not m.bot}
+        self.order: list[_JoinKey] = sorted(self.keys.values())
+
+    def add(self, member: Member):
+        if member.bot:
+            return
+        key = _join_key(member)
+        old = self.keys.get(member.id)
+        if old == key:
+            return
+        # 漏掉离开事件后重新加入时，加入时间会改变，需要替换旧的记录
+        if old is not None:
+            self.remove(member.id)
+        self.keys[member.id] = key
+        insort(self.order, key)
+
+    def remove(self, user_id: int):
+        key = self.keys.pop(user_id, None)
+        if key is None:
+            return
+        i = bisect_left(self.order, key)
+        if i < len(self.order) and self.order[i] == key:
+            del self.order[i]
+
+
+class MemberIndex:
+    """Non-bot members of each guild sorted by join time."""
+
+    def __init__(self):
+        self._guilds: dict[int, _GuildMembers] = {}
+
+    def build(self, guild: Guild):
+        self._guilds[guild.id] = _GuildMembers(list(guild.members))
+
+    def drop(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    def _get(self, guild: Guild):
+        # 还没有建立索引时（例如重新加载扩展后）从成员缓存建立
+        index = self._guilds.get(guild.id)
+        if index is None:
+            self.build(guild)
+            index = self._guilds[guild.id]
+        return index
+
+    def add(self, member: Member):
+        index = self._guilds.get(member.guild.id)
+        if index is not None:
+            index.add(member)
+
+    def remove(self, guild_id: int, user_id: int):
+        index = self._guilds.get(guild_id)
+        if index is not None:
+            index.remove(user_id)
+
+    def count(self, guild: Guild):
+        # 服务器中非bot成员的数量
+        return len(self._get(guild).order)
+
+    def reconcile(self, guild: Guild):
+        # 与成员缓存对比成员和加入时间，不一致时重建索引，返回不一致的成员数量
+        index = self._guilds.get(guild.id)
+        fresh = _GuildMembers(list(guild.members))
+        self._guilds[guild.id] = fresh
+        if index is None:
+            return 0
+        stale = [
+            user_id
+            for user_id in index.keys.keys() | fresh.keys.keys()
+            if index.keys.get(user_id) != fresh.keys.get(user_id)
+        ]
+        return len(stale)
+
+    def position(self, member: Member):
+        # 成员在服务器非bot成员中按加入时间的排名，从1开始
+        if member.bot:
+            raise ValueError(f"{member} is a bot")
+        index = self._get(member.guild)
+        # 加入事件可能还未处理，缺少时直接插入
+        index.add(member)
+        return bisect_left(index.order, index.keys[member.id]) + 1
+
+
+member_index = MemberIndex()
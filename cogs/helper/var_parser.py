@@ -10,6 +10,7 @@
 from utils.remote_config import remote_config
 
 from .formats import ordinal, timestamp
+from .members import member_index
 
 __all__ = (
     "VarContext",
@@ -69,18 +70,13 @@ def from_member_join(cls, bot: SkyM8, member: Member):
 
 
 def _member_pos(member: Member):
-    # 筛选掉bot用户
-    members = [m for m in member.guild.members if not m.bot]
-    # 按加入时间排序
-    members = sorted(members, key=lambda m: m.joined_at or datetime.max)
-    pos = members.index(member) + 1
-    return pos
+    # 在非bot成员中按加入时间的排名，由成员索引维护
+    return member_index.position(member)
 
 
 def _member_count(guild: Guild):
-    # 筛选掉bot用户
-    members = [m for m in guild.members if not m.bot]
-    return len(members)
+    # 非bot成员数量，由成员索引维护
+    return member_index.count(guild)
 
 
 def _id(value: str):
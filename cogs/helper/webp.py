@@ -0,0 +1,133 @@
+import io
+import struct
+
+from PIL.Image import Image as PImage
+
+__all__ = ("AnimatedWebP",)
+
+# VP8X标志位
+_FLAG_ALPHA = 0x10
+_FLAG_ANIMATION = 0x02
+# ANMF标志位
+_DISPOSE_BACKGROUND = 0x01
+_NO_BLEND = 0x02
+
+
+def _chunk(fourcc: bytes, payload: bytes):
+    # 数据长度为奇数时需要补一个字节
+    padding = b"\x00" if len(payload) % 2 else b""
+    return fourcc + struct.pack("<I", len(payload)) + payload + padding
+
+
+def _uint24(value: int):
+    return value.to_bytes(3, "little")
+
+
+def _iter_chunks(data: bytes):
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WEBP":
+        raise ValueError("Not a WebP image")
+    pos = 12
+    while pos + 8 <= len(data):
+        fourcc = data[pos : pos + 4]
+        (size,) = struct.unpack_from("<I", data, pos + 4)
+        yield fourcc, data[pos + 8 : pos + 8 + size]
+        pos += 8 + size + (size & 1)
+
+
+def _frame_size(fourcc: bytes, payload: bytes):
+    if fourcc == b"VP8X":
+        w = int.from_bytes(payload[4:7], "little") + 1
+        h = int.from_bytes(payload[7:10], "little") + 1
+        return w, h
+    if fourcc == b"VP8L":
+        # 1字节签名后是14位宽度和14位高度
+        (bits,) = struct.unpack_from("<I", payload, 1)
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if fourcc == b"VP8 ":
+        # 3字节帧标记和3字节起始码后是宽度和高度，各取低14位
+        w, h = struct.unpack_from("<HH", payload, 6)
+        return w & 0x3FFF, h & 0x3FFF
+    return None
+
+
+class AnimatedWebP:
+    """Assemble an animated WebP file in memory from encoded still frames."""
+
+    def __init__(
+        self,
+        size: tuple[int, int],
+        *,
+        loop: int = 0,
+        background: tuple[int, int, int, int] = (0, 0, 0, 0),
+    ):
+        self.size = size
+        self.loop = loop
+        self.background = background
+        self._frames: list[bytes] = []
+        self._alpha = False
+
+    def __len__(self):
+        return len(self._frames)
+
+    def add_frame(
+        self,
+        data: bytes,
+        duration: int,
+        *,
+        offset: tuple[int, int] = (0, 0),
+        dispose: bool = True,
+        blend: bool = True,
+    ):
+        # 从编码好的单帧WebP中取出图像数据（ALPH + VP8/VP8L），丢弃文件头和VP8X等元数据
+        frame_data = b""
+        frame_size = None
+        for fourcc, payload in _iter_chunks(data):
+            if fourcc == b"VP8X":
+                frame_size = _frame_size(fourcc, payload)
+            elif fourcc in (b"ALPH", b"VP8 ", b"VP8L"):
+                frame_size = frame_size or _frame_size(fourcc, payload)
+                frame_data += _chunk(fourcc, payload)
+                # 有损压缩带ALPH块，无损压缩VP8L本身可能带透明通道
+                self._alpha = self._alpha or fourcc != b"VP8 "
+            elif fourcc == b"ANIM":
+                raise ValueError("Frame data must be a still WebP image")
+        if frame_size is None:
+            raise ValueError("Frame contains no image data")
+
+        x, y = offset
+        w, h = frame_size
+        # 帧未覆盖整个画布时，其余部分显示为透明背景，同样需要透明通道标志
+        if (x, y, w, h) != (0, 0, *self.size):
+            self._alpha = True
+        # 偏移量以2像素为单位存储
+        flags = (0 if blend else _NO_BLEND) | (_DISPOSE_BACKGROUND if dispose else 0)
+        header = b"".join(
+            [
+                _uint24(x // 2),
+                _uint24(y // 2),
+                _uint24(w - 1),
+                _uint24(h - 1),
+                _uint24(min(max(duration, 0), 0xFFFFFF)),
+                bytes([flags]),
+            ]
+        )
+        self._frames.append(_chunk(b"ANMF", header + frame_data))
+
+    def add_image(self, im: PImage, duration: int, **params):
+        # params直接传给PIL的WebP编码器，例如quality和method
+        buffer = io.BytesIO()
+        im.save(buffer, format="WEBP", **params)
+        self.add_frame(buffer.getvalue(), duration)
+
+    def getvalue(self):
+        if not self._frames:
+            raise ValueError("Animation contains no frames")
+        w, h = self.size
+        flags = _FLAG_ANIMATION | (_FLAG_ALPHA if self._alpha else 0)
+        vp8x = bytes([flags, 0, 0, 0]) + _uint24(w - 1) + _uint24(h - 1)
+        # 背景色按BGRA顺序存储
+        r, g, b, a = self.background
+        anim = bytes([b, g, r, a]) + struct.pack("<H", self.loop)
+        body = b"WEBP" + _chunk(b"VP8X", vp8x) + _chunk(b"ANIM", anim)
+        body += b"".join(self._frames)
+        return b"RIFF" + struct.pack("<I", len(body)) + body
@@ -0,0 +1,59 @@
+import discord
+from discord.ext import commands, tasks
+
+from sky_m8 import SkyM8
+
+from .helper.members import member_index
+from .helper.times import sky_time_now
+
+
+class MemberTracker(commands.Cog):
+    def __init__(self, bot: SkyM8):
+        self.bot = bot
+
+    async def cog_load(self):
+        # 重新加载扩展时，已经可用的服务器不会再触发guild_available
+        for guild in self.bot.guilds:
+            member_index.build(guild)
+        self.reconcile_members.start()
+
+    async def cog_unload(self):
+        self.reconcile_members.cancel()
+
+    @tasks.loop(hours=1)
+    async def reconcile_members(self):
+        # 定期与成员缓存对比，修正漏掉的加入和离开事件
+        for guild in self.bot.guilds:
+            if guild.unavailable or not guild.chunked:
+                continue
+            if diff := member_index.reconcile(guild):
+                print(f"[{sky_time_now()}] Member index of {guild.name}({guild.id}) had {diff} stale members, rebuilt.")  # fmt: skip
+
+    @reconcile_members.before_loop
+    async def before_reconcile_members(self):
+        await self.bot.wait_until_ready()
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild):
+        member_index.build(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        member_index.build(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        member_index.drop(guild.id)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        member_index.add(member)
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent):
+        # 使用raw事件，成员不在缓存中时也能收到
+        member_index.remove(payload.guild_id, payload.user.id)
+
+
+async def setup(bot: SkyM8):
+    await bot.add_cog(MemberTracker(bot))
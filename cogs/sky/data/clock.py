@@ -1,18 +1,23 @@
 import json
-from datetime import datetime, timedelta
-from typing import NamedTuple, TypedDict
+from datetime import datetime, time, timedelta
+from typing import Iterable, NamedTuple, TypedDict
+
+import numpy as np
 
 from cogs.emoji_manager import Emojis
+from cogs.helper.times import SKY_TIMEZONE
 from utils.remote_config import remote_config
 
 from .shard import get_shard_info
 
 __all__ = (
     "ClockEventData",
+    "ClockSchedule",
     "fetch_displayed_event_groups",
     "fetch_all_event_data",
     "filter_events",
     "get_clock_event_time",
+    "get_clock_schedule",
 )
 
 
@@ -181,3 +186,57 @@ def get_clock_event_time(now: datetime, event_data: ClockEventData):
     if days_of_month is not None and next_begin_time.day not in days_of_month:
         next_begin_time = None
     return current_end_time, next_begin_time
+
+
+class ClockSchedule(NamedTuple):
+    # 所有事件发生的开始和结束时间，均为Unix时间戳（秒）
+    starts: np.ndarray
+    ends: np.ndarray
+
+
+def _peak_shard_available(date: datetime):
+    shard_info = get_shard_info(date)
+    return shard_info.has_shard and shard_info.extra_shard
+
+
+def get_clock_schedule(
+    start: datetime,
+    days: int,
+    event_ids: Iterable[str] | None = None,
+    *,
+    data: dict[str, ClockEventData] | None = None,
+):
+    data = data or _clock_event_data
+    event_ids = data.keys() if event_ids is None else event_ids
+    start = start.astimezone(SKY_TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+    dates = [start.date() + timedelta(days=i) for i in range(days + 1)]
+    # 每天零点的时间戳，多取一天用于计算每天的长度
+    midnights = [datetime.combine(d, time(), SKY_TIMEZONE) for d in dates]
+    day_starts = np.array([m.timestamp() for m in midnights], dtype=np.int64)
+    # 夏令时切换的日子不是24小时，这些日子需要单独按挂钟时间计算
+    dst_days = np.flatnonzero(np.diff(day_starts) != 24 * 3600)
+    day_starts = day_starts[:-1]
+    days_of_month = np.array([d.day for d in dates[:-1]], dtype=np.int64)
+
+    schedule: dict[str, ClockSchedule] = {}
+    for e in event_ids:
+        if e not in data:
+            continue
+        d = data[e]
+        # 一天内每次事件开始时相对零点的分钟数
+        minutes = np.arange(d.offset, 24 * 60, d.period, dtype=np.int64)
+        # 筛选事件可用的日子
+        mask = np.ones(days, dtype=bool)
+        if d.days_of_month is not None:
+            mask &= np.isin(days_of_month, d.days_of_month)
+        if d.id == "peakshard":
+            available = [_peak_shard_available(m) for m in midnights[:-1]]
+            mask &= np.array(available, dtype=bool)
+        starts = day_starts[:, None] + minutes[None, :] * 60
+        for i in dst_days:
+            if mask[i]:
+                starts[i] = [(midnights[i] + timedelta(minutes=int(m))).timestamp() for m in minutes]  # fmt: skip
+        starts = starts[mask].ravel()
+        ends = starts + d.duration * 60
+        schedule[e] = ClockSchedule(starts, ends)
+    return schedule
@@ -0,0 +1,213 @@
+import calendar
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, Iterator
+
+from cogs.helper.times import SKY_TIMEZONE, utcnow
+
+from .clock import ClockEventData, get_clock_schedule
+from .shard import ShardType, get_shard_info
+
+__all__ = (
+    "add_months",
+    "iter_calendar",
+)
+
+_PRODID = "-//SKY-M8//Sky Calendar//EN"
+_UID_DOMAIN = "sky-m8"
+# 按日期条件出现的事件无法用RRULE表示，需要逐个生成VEVENT
+_CONDITIONAL_EVENTS = ["peakshard"]
+
+_VTIMEZONE = [
+    "BEGIN:VTIMEZONE",
+    f"TZID:{SKY_TIMEZONE.key}",
+    "BEGIN:DAYLIGHT",
+    "TZOFFSETFROM:-0800",
+    "TZOFFSETTO:-0700",
+    "TZNAME:PDT",
+    "DTSTART:20070311T020000",
+    "RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=2SU",
+    "END:DAYLIGHT",
+    "BEGIN:STANDARD",
+    "TZOFFSETFROM:-0700",
+    "TZOFFSETTO:-0800",
+    "TZNAME:PST",
+    "DTSTART:20071104T020000",
+    "RRULE:FREQ=YEARLY;BYMONTH=11;BYDAY=1SU",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+]
+
+
+def add_months(d: date, months: int):
+    month = d.month - 1 + months
+    year = d.year + month // 12
+    month = month % 12 + 1
+    day = min(d.day, calendar.monthrange(year, month)[1])
+    return d.replace(year=year, month=month, day=day)
+
+
+def _escape(text: str):
+    # 移除Discord自定义表情的标记，日历客户端无法显示
+    text = re.sub(r"<a?:\w+:\d+>\s*", "", text)
+    text = text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+    return text.replace("\n", "\\n").strip()
+
+
+def _fold(line: str):
+    # 每行最多75个字节，超出部分换行并以空格开头
+    data = line.encode()
+    if len(data) <= 75:
+        return line + "\r\n"
+    parts: list[str] = []
+    chunk = ""
+    size, limit = 0, 75
+    for ch in line:
+        n = len(ch.encode())
+        if size + n > limit:
+            parts.append(chunk)
+            chunk, size, limit = "", 0, 74
+        chunk += ch
+        size += n
+    parts.append(chunk)
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _utc(ts: float):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _local(dt: datetime):
+    return dt.strftime("%Y%m%dT%H%M%S")
+
+
+def _vevent(uid: str, stamp: str, props: list[str]):
+    lines = ["BEGIN:VEVENT", f"UID:{uid}@{_UID_DOMAIN}", f"DTSTAMP:{stamp}", *props, "END:VEVENT"]
+    return "".join(_fold(line) for line in lines)
+
+
+def _periodic_events(
+    event: ClockEventData,
+    start: datetime,
+    end: datetime,
+    stamp: str,
+):
+    if event.days_of_month is None:
+        first = start
+        rule = "FREQ=DAILY"
+    else:
+        # 找到窗口内第一个符合日期的日子作为DTSTART
+        first = start
+        while first < end and first.day not in event.days_of_month:
+            first += timedelta(days=1)
+        if first >= end:
+            return
+        month_days = ",".join(str(d) for d in event.days_of_month)
+        rule = f"FREQ=MONTHLY;BYMONTHDAY={month_days}"
+    until = _utc(end.timestamp())
+    # 一天内每个开始时间各生成一个按天/月重复的事件，保证夏令时切换时挂钟时间不变
+    for minute in range(event.offset, 24 * 60, event.period):
+        dtstart = first + timedelta(minutes=minute)
+        yield _vevent(
+            f"{event.id}-{minute}-{_local(first)[:8]}",
+            stamp,
+            [
+                f"SUMMARY:{_escape(event.name)}",
+                f"DTSTART;TZID={SKY_TIMEZONE.key}:{_local(dtstart)}",
+                f"DURATION:PT{event.duration}M",
+                f"RRULE:{rule};UNTIL={until}",
+            ],
+        )
+
+
+def _conditional_events(
+    event: ClockEventData,
+    start: datetime,
+    days: int,
+    data: dict[str, ClockEventData],
+    stamp: str,
+):
+    schedule = get_clock_schedule(start, days, [event.id], data=data)
+    if event.id not in schedule:
+        return
+    starts, ends = schedule[event.id]
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        yield _vevent(
+            f"{event.id}-{s}",
+            stamp,
+            [
+                f"SUMMARY:{_escape(event.name)}",
+                f"DTSTART:{_utc(s)}",
+                f"DTEND:{_utc(e)}",
+            ],
+        )
+
+
+def _shard_events(
+    start: datetime,
+    days: int,
+    translations: dict[str, str],
+    stamp: str,
+):
+    for i in range(days):
+        info = get_shard_info(start + timedelta(days=i))
+        if not info.has_shard:
+            continue
+        symbol = "🔴" if info.type == ShardType.Red else "⚫"
+        place = ", ".join(translations.get(n, n) for n in (info.map, info.realm))
+        summary = f"{symbol} {info.type.name} Shard - {place}"
+        reward = f"Reward: {info.reward_number} {info.reward_type.name}"
+        for n, (_, land, end) in enumerate(info.occurrences):
+            yield _vevent(
+                f"shard-{info.date:%Y%m%d}-{n}",
+                stamp,
+                [
+                    f"SUMMARY:{_escape(summary)}",
+                    f"DESCRIPTION:{_escape(reward)}",
+                    f"DTSTART:{_utc(land.timestamp())}",
+                    f"DTEND:{_utc(end.timestamp())}",
+                ],
+            )
+
+
+def iter_calendar(
+    start: datetime,
+    months: int,
+    data: dict[str, ClockEventData],
+    *,
+    event_ids: Iterable[str] | None = None,
+    translations: dict[str, str] | None = None,
+    shards: bool = True,
+) -> Iterator[bytes]:
+    """Generate an iCalendar file of Sky Clock events and shards chunk by chunk.
+
+    Each chunk is a complete component, so the output can be written to a file
+    or streamed as a chunked HTTP response without building the whole calendar.
+    """
+    start = start.astimezone(SKY_TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+    end_date = add_months(start.date(), months)
+    end = start.replace(year=end_date.year, month=end_date.month, day=end_date.day)
+    days = (end_date - start.date()).days
+    stamp = utcnow().strftime("%Y%m%dT%H%M%SZ")
+    translations = translations or {}
+
+    header = ["BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{_PRODID}", "CALSCALE:GREGORIAN"]
+    header += ["X-WR-CALNAME:Sky Calendar", *_VTIMEZONE]
+    yield "".join(_fold(line) for line in header).encode()
+
+    event_ids = data.keys() if event_ids is None else event_ids
+    for e in event_ids:
+        if e not in data:
+            continue
+        if e in _CONDITIONAL_EVENTS:
+            chunks = _conditional_events(data[e], start, days, data, stamp)
+        else:
+            chunks = _periodic_events(data[e], start, end, stamp)
+        for chunk in chunks:
+            yield chunk.encode()
+
+    if shards:
+        for chunk in _shard_events(start, days, translations, stamp):
+            yield chunk.encode()
+
+    yield _fold("END:VCALENDAR").encode()
@@ -1,8 +1,10 @@
-from datetime import datetime, time, timedelta
+from datetime import date, datetime, time, timedelta
 from enum import Enum
 from typing import NamedTuple
 
-from cogs.helper.times import SKY_TIMEZONE
+import numpy as np
+
+from cogs.helper.times import SKY_TIMEZONE, sky_time_now
 
 __all__ = (
     "ShardType",
@@ -10,6 +12,8 @@
     "ShardTime",
     "ShardInfo",
     "get_shard_info",
+    "get_shard_range",
+    "refresh_shard_table",
     "MemoryType",
     "ShardExtra",
 )
@@ -107,6 +111,17 @@ class _ShardData(NamedTuple):
 }
 
 
+_all_datas = black_datas + red_datas
+shard_maps = list(dict.fromkeys(m for d in _all_datas for m in d.maps))
+# 以下查找表按 [数据索引, 地区索引/星期] 排列，用于向量化计算
+_no_shard_lut = np.array([[w in d.no_shard_day for w in range(7)] for d in _all_datas])
+_extra_shard_lut = np.array(
+    [[r == "prairie" and m == "butterfly" for r, m in zip(realms, d.maps)] for d in _all_datas]
+)
+_map_lut = np.array([d.maps for d in _all_datas])
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
 def _get_data(day) -> tuple[_ShardData, bool]:
     is_red = day % 2 == 1
     datas = red_datas if is_red else black_datas
@@ -115,16 +130,30 @@ def _get_data(day) -> tuple[_ShardData, bool]:
     return data, is_red
 
 
-def get_shard_info(when: datetime):
-    when = when.astimezone(SKY_TIMEZONE)
-    date = when.replace(hour=0, minute=0, second=0, microsecond=0)
-    day = date.day
+def _shard_columns(days: np.ndarray):
+    # days: datetime64[D]数组，返回每天的数据索引、地区索引、是否有碎石、是否有额外烛火
+    day = (days - days.astype("datetime64[M]")).astype(np.int64) + 1
+    weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01是星期四
+    is_red = day % 2 == 1
+    red_idx = (day - 1) // 2 % len(red_datas)
+    black_idx = (day // 2 - 1) % len(black_datas)
+    data_idx = np.where(is_red, len(black_datas) + red_idx, black_idx)
     realm_idx = (day - 1) % len(realms)
-    data, is_red = _get_data(day)
+    has_shard = ~_no_shard_lut[data_idx, weekday]
+    extra_shard = _extra_shard_lut[data_idx, realm_idx]
+    return data_idx.astype(np.int8), realm_idx.astype(np.int8), has_shard, extra_shard
+
+
+def _build_shard_info(
+    date: datetime,
+    data: _ShardData,
+    is_red: bool,
+    realm_idx: int,
+    has_shard: bool,
+):
     realm = realms[realm_idx]
     map = data.maps[realm_idx]
     reward = reward_override.get(map) or data.reward_number
-    has_shard = date.weekday() not in data.no_shard_day
     extra_shard = realm == "prairie" and map == "butterfly"
 
     first_start = datetime.combine(date, data.start, SKY_TIMEZONE)
@@ -149,6 +178,93 @@ def get_shard_info(when: datetime):
     )
 
 
+class _ShardTable:
+    # 以日期序数为索引的碎石数据表，覆盖center前后radius天
+    def __init__(self, center: date, radius: int):
+        self.center = center.toordinal()
+        self.radius = radius
+        self.first = self.center - radius
+        days = np.arange(self.first, self.center + radius + 1) - _EPOCH_ORDINAL
+        columns = _shard_columns(days.astype("datetime64[D]"))
+        self.data_idx, self.realm_idx, self.has_shard, self.extra_shard = columns
+        # ShardInfo在首次访问时创建，之后直接复用
+        self._infos: list[ShardInfo | None] = [None] * len(days)
+
+    def __contains__(self, ordinal: int):
+        return 0 <= ordinal - self.first < len(self._infos)
+
+    def get(self, when: datetime):
+        index = when.toordinal() - self.first
+        if not 0 <= index < len(self._infos):
+            return None
+        info = self._infos[index]
+        if info is None:
+            date = datetime.combine(when.date(), time(), SKY_TIMEZONE)
+            data_idx = int(self.data_idx[index])
+            data = _all_datas[data_idx]
+            is_red = data_idx >= len(black_datas)
+            realm_idx = int(self.realm_idx[index])
+            has_shard = bool(self.has_shard[index])
+            info = _build_shard_info(date, data, is_red, realm_idx, has_shard)
+            self._infos[index] = info
+        return info
+
+
+_TABLE_RADIUS = 2 * 366
+_table: _ShardTable | None = None
+
+
+def refresh_shard_table(today: datetime | None = None):
+    # 当今天偏离数据表中心超过一半范围时，以今天为中心重建数据表
+    global _table
+    today = (today or sky_time_now()).astimezone(SKY_TIMEZONE)
+    if _table is None or abs(today.toordinal() - _table.center) > _TABLE_RADIUS // 2:
+        _table = _ShardTable(today.date(), _TABLE_RADIUS)
+    return _table
+
+
+def get_shard_info(when: datetime):
+    when = when.astimezone(SKY_TIMEZONE)
+    table = _table or refresh_shard_table()
+    if info := table.get(when):
+        return info
+    # 超出数据表范围的日期直接计算
+    date = when.replace(hour=0, minute=0, second=0, microsecond=0)
+    day = date.day
+    realm_idx = (day - 1) % len(realms)
+    data, is_red = _get_data(day)
+    has_shard = date.weekday() not in data.no_shard_day
+    return _build_shard_info(date, data, is_red, realm_idx, has_shard)
+
+
+def get_shard_range(
+    start: datetime,
+    end: datetime,
+    *,
+    type: ShardType | None = None,
+    realm: str | None = None,
+    map: str | None = None,
+    has_shard: bool | None = True,
+):
+    # 查找[start, end)范围内所有符合条件的日子，筛选条件为None时不做限制
+    start = start.astimezone(SKY_TIMEZONE)
+    end = end.astimezone(SKY_TIMEZONE)
+    first = np.datetime64(start.date(), "D")
+    days = np.arange(first, np.datetime64(end.date(), "D"))
+    data_idx, realm_idx, has_shard_col, _ = _shard_columns(days)
+    mask = np.ones(len(days), dtype=bool)
+    if type is not None:
+        mask &= (data_idx >= len(black_datas)) == (type == ShardType.Red)
+    if realm is not None:
+        mask &= realm_idx == (realms.index(realm) if realm in realms else -1)
+    if map is not None:
+        mask &= _map_lut[data_idx, realm_idx] == map
+    if has_shard is not None:
+        mask &= has_shard_col == has_shard
+    start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    return [get_shard_info(start + timedelta(days=int(i))) for i in np.flatnonzero(mask)]
+
+
 class MemoryType(Enum):
     Jelly = 1
     Crab = 2
@@ -0,0 +1,110 @@
+import base64
+import calendar
+import json
+import zlib
+from datetime import date, datetime
+
+from cogs.helper.times import sky_time_now
+from utils.remote_config import remote_config
+
+from .shard import ShardExtra
+
+__all__ = (
+    "ShardHistory",
+    "shard_history",
+)
+
+
+def _month_field(year: int, month: int):
+    return f"{date(year, month, 1):%Y/%m}"
+
+
+def _encode_month(month_extra: dict[int, dict]):
+    raw = json.dumps(month_extra, separators=(",", ":")).encode()
+    return base64.b64encode(zlib.compress(raw, 9)).decode()
+
+
+def _decode_month(value: str) -> dict[int, dict]:
+    raw = zlib.decompress(base64.b64decode(value))
+    return {int(d): v for d, v in json.loads(raw).items()}
+
+
+class ShardHistory:
+    # 当前及之后月份的记录保存在热数据哈希表中，每天一个字段
+    # 之前月份的记录压缩成每月一个字段，保存在归档哈希表中
+    _HOT_KEY = "shard.extra"
+    _ARCHIVE_KEY = "shard.extra.archive"
+
+    def _is_hot(self, year: int, month: int, today: date | None = None):
+        today = today or sky_time_now().date()
+        return (year, month) >= (today.year, today.month)
+
+    async def _get_archived(self, *months: tuple[int, int]):
+        fields = [_month_field(y, m) for y, m in months]
+        values = await remote_config.get_fields(self._ARCHIVE_KEY, *fields)
+        return [_decode_month(v) if v else {} for v in values]
+
+    async def get_month(self, year: int, month: int):
+        days = calendar.monthrange(year, month)[1]
+        fields = [f"{date(year, month, d):%Y/%m/%d}" for d in range(1, days + 1)]
+        values = await remote_config.get_fields(self._HOT_KEY, *fields)
+        raw = {d: json.loads(v) for d, v in enumerate(values, 1) if v}
+        if not self._is_hot(year, month):
+            # 归档后写入的记录仍在热数据中，优先使用
+            archived = (await self._get_archived((year, month)))[0]
+            raw = archived | raw
+        return {d: ShardExtra.from_dict(v) for d, v in raw.items()}
+
+    async def set(self, when: datetime, info: ShardExtra):
+        # 总是写入热数据，旧月份的记录会在下次压缩时合并到归档中
+        field = f"{when:%Y/%m/%d}"
+        await remote_config.set_field(self._HOT_KEY, field, info.to_dict())
+
+    async def get_range(self, start: date, end: date):
+        # 读取[start, end)范围内的所有记录，只读取范围内月份的归档
+        months: list[tuple[int, int]] = []
+        y, m = start.year, start.month
+        while (y, m) <= (end.year, end.month):
+            months.append((y, m))
+            y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+        result: dict[date, ShardExtra] = {}
+        cold = [ym for ym in months if not self._is_hot(*ym)]
+        for (y, m), month_extra in zip(cold, await self._get_archived(*cold)):
+            for d, v in month_extra.items():
+                result[date(y, m, d)] = ShardExtra.from_dict(v)
+        # 热数据表很小，先读取字段名，再读取范围内的字段
+        # 归档后写入的记录仍在热数据中，优先使用
+        fields = [
+            field
+            for field in await remote_config.get_field_names(self._HOT_KEY)
+            if start <= datetime.strptime(field, "%Y/%m/%d").date() < end
+        ]
+        values = await remote_config.get_fields(self._HOT_KEY, *fields)
+        for field, v in zip(fields, values):
+            if v:
+                result[datetime.strptime(field, "%Y/%m/%d").date()] = ShardExtra.from_dict(json.loads(v))  # fmt: skip
+        return {d: v for d, v in sorted(result.items()) if start <= d < end}
+
+    async def compact(self, today: date | None = None):
+        # 将当前月份之前的记录从热数据移动到归档中
+        today = today or sky_time_now().date()
+        fields = await remote_config.get_field_names(self._HOT_KEY)
+        groups: dict[tuple[int, int], list[str]] = {}
+        for field in fields:
+            day = datetime.strptime(field, "%Y/%m/%d").date()
+            if not self._is_hot(day.year, day.month, today):
+                groups.setdefault((day.year, day.month), []).append(field)
+        for (y, m), month_fields in sorted(groups.items()):
+            archived = (await self._get_archived((y, m)))[0]
+            values = await remote_config.get_fields(self._HOT_KEY, *month_fields)
+            hot = {field: v for field, v in zip(month_fields, values) if v}
+            for field, v in hot.items():
+                archived[int(field[-2:])] = json.loads(v)
+            # 先写入归档再删除热数据，中途失败也不会丢失记录
+            await remote_config.set_field(self._ARCHIVE_KEY, _month_field(y, m), _encode_month(archived))  # fmt: skip
+            # 期间被重新写入的字段保留在热数据中，下次压缩时再归档
+            await remote_config.delete_fields_if(self._HOT_KEY, hot)
+        return sum(len(f) for f in groups.values())
+
+
+shard_history = ShardHistory()
@@ -0,0 +1,68 @@
+import asyncio
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+from cogs.helper.times import SKY_TIMEZONE, sky_time_now
+
+from .shard import MemoryType, ShardExtra, get_shard_info
+from .shard_history import shard_history
+
+__all__ = (
+    "ShardStats",
+    "shard_stats",
+)
+
+# 只统计最近两年的记录，避免读取全部历史
+_STATS_DAYS = 2 * 366
+
+
+class ShardStats:
+    # 按地图和星期统计碎石回忆出现的次数，记录时增量更新
+    def __init__(self):
+        self.by_map: dict[str, Counter[MemoryType]] = {}
+        self.by_weekday: dict[int, Counter[MemoryType]] = {}
+        self._records: dict[date, tuple[str, MemoryType]] = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self.start: date | None = None
+
+    @property
+    def total(self):
+        return len(self._records)
+
+    def _add(self, day: date, map: str, memory: MemoryType, sign: int):
+        for counters, key in ((self.by_map, map), (self.by_weekday, day.weekday())):
+            counter = counters.setdefault(key, Counter())  # type: ignore
+            counter[memory] += sign
+            if counter[memory] <= 0:
+                del counter[memory]
+
+    def record(self, when: datetime | date, extra: ShardExtra):
+        day = when.date() if isinstance(when, datetime) else when
+        # 统计范围之前的记录不计入
+        if self.start is not None and day < self.start:
+            return
+        # 覆盖之前的记录时先减去旧值
+        if old := self._records.pop(day, None):
+            self._add(day, *old, sign=-1)
+        if not extra.has_memory:
+            return
+        info = get_shard_info(datetime.combine(day, time(), SKY_TIMEZONE))
+        self._records[day] = (info.map, extra.memory_type)
+        self._add(day, info.map, extra.memory_type, sign=1)
+
+    async def ensure_loaded(self):
+        async with self._lock:
+            if self._loaded:
+                return
+            today = sky_time_now().date()
+            self.start = today - timedelta(days=_STATS_DAYS)
+            records = await shard_history.get_range(self.start, today + timedelta(days=1))
+            for day, extra in records.items():
+                # 加载期间新写入的记录以内存中的为准
+                if day not in self._records:
+                    self.record(day, extra)
+            self._loaded = True
+
+
+shard_stats = ShardStats()
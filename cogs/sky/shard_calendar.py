@@ -1,8 +1,9 @@
+import asyncio
 import calendar
-import json
+import io
 import re
-from datetime import datetime, timedelta
-from typing import Any, Literal, TypedDict, cast
+from datetime import date, datetime, timedelta
+from typing import Any, Literal, NamedTuple, TypedDict, cast
 
 import discord
 from discord import ButtonStyle, Interaction, app_commands, ui
@@ -15,16 +16,24 @@
 
 from ..base.live_update import LiveUpdateCog
 from ..emoji_manager import Emojis
+from ..helper.cache import LRUCache
 from ..helper.converters import DayTransformer, MonthTransformer, YearTransformer
 from ..helper.embeds import fail, success
-from ..helper.times import sky_datetime, sky_time, sky_time_now
+from ..helper.times import SKY_TIMEZONE, sky_datetime, sky_time, sky_time_now
 from .data.shard import (
     MemoryType,
     ShardExtra,
     ShardInfo,
     ShardType,
     get_shard_info,
+    get_shard_range,
+    realms,
+    refresh_shard_table,
+    shard_maps,
 )
+from .data.shard_history import shard_history
+from .data.shard_stats import shard_stats
+from .shard_image import render_month_calendar
 
 __all__ = ("ShardCalendar",)
 
@@ -92,6 +101,11 @@ def get_shard_config():
     return shard_cfg.copy()
 
 
+class _CachedPayload(NamedTuple):
+    data: dict[str, Any]
+    expires: datetime
+
+
 class ShardCalendar(
     LiveUpdateCog,
     live_key="shardCalendar.webhooks",
@@ -104,19 +118,31 @@ class ShardCalendar(
         description="A group of commands to view and config shards information.",
     )
 
+    # 按月缓存碎石额外信息，键为(年, 月)，值为{日: 信息}
+    _extra_cache: LRUCache[tuple[int, int], dict[int, ShardExtra]] = LRUCache(24)
+
+    @classmethod
+    async def _get_month_extra(cls, date: datetime):
+        key = (date.year, date.month)
+        if (month_extra := cls._extra_cache.get(key)) is not None:
+            return month_extra
+        # 一次读取整个月的数据
+        month_extra = await shard_history.get_month(date.year, date.month)
+        cls._extra_cache[key] = month_extra
+        return month_extra
+
     @classmethod
     async def set_extra_info(cls, date: datetime, info: ShardExtra):
-        field = f"{date:%Y/%m/%d}"
-        await remote_config.set_field("shard.extra", field, info.to_dict())
+        await shard_history.set(date, info)
+        shard_stats.record(date, info)
+        # 同步更新已缓存的月份
+        if (month_extra := cls._extra_cache.get((date.year, date.month))) is not None:
+            month_extra[date.day] = info
 
     @classmethod
     async def get_extra_info(cls, date: datetime):
-        field = f"{date:%Y/%m/%d}"
-        value = await remote_config.get_field("shard.extra", field)
-        if not value:
-            return None
-        info = ShardExtra.from_dict(json.loads(value))
-        return info
+        month_extra = await cls._get_month_extra(date)
+        return month_extra.get(date.day)
 
     @classmethod
     async def get_config(cls):
@@ -137,11 +163,18 @@ async def get_config(cls):
 
     def __init__(self, bot: SkyM8):
         super().__init__(bot)
+        # 每次重新加载配置时递增，用于使依赖配置的缓存失效
+        self.config_version = 0
+        self._calendar_images: LRUCache[tuple[int, int, int], bytes] = LRUCache(12)
+        # 今天前后几天的消息数据，导航按钮可以直接从内存中返回
+        self._warm_days = 1
+        self._payloads: dict[tuple[date, bool], _CachedPayload] = {}
 
     async def cog_load(self):
         # 加载配置
         global shard_cfg
         shard_cfg = await self.get_config()
+        self.config_version += 1
         # 设置更新时间
         self.set_update_time()
         self.refresh_calendar_state.start()
@@ -159,13 +192,7 @@ def set_update_time(self):
         times = [t.timetz() for st in info.occurrences for t in st[1:]]
         self.update_live_msg.change_interval(time=times)
 
-    async def get_shard_message_data(
-        self,
-        *,
-        date: datetime = MISSING,
-        persistent: bool = True,
-    ) -> dict[str, Any]:
-        date = date or sky_time_now()
+    async def _build_shard_message_data(self, date: datetime, persistent: bool):
         info = get_shard_info(date)
         extra = await self.get_extra_info(date)
         # 实时消息不显示跳转今天按钮，且设置为持久化
@@ -177,7 +204,41 @@ async def get_shard_message_data(
             show_today=not persistent,
             persistent=persistent,
         )
-        return {"view": view}
+        # 时间线会在碎石降落和结束时变化，跳转今天的按钮会在第二天变化
+        now = view.created_at
+        times = [t for st in info.occurrences for t in st[1:] if t > now]
+        next_day = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        expires = min(times + [next_day])
+        return _CachedPayload({"view": view}, expires)
+
+    def _in_warm_window(self, date: datetime):
+        today = sky_time_now().date()
+        return abs((date.date() - today).days) <= self._warm_days
+
+    async def refresh_payloads(self):
+        # 重新生成今天前后几天的消息数据
+        self._payloads.clear()
+        today = sky_time_now()
+        for i in range(-self._warm_days, self._warm_days + 1):
+            date = today + timedelta(days=i)
+            self._payloads[(date.date(), False)] = await self._build_shard_message_data(date, False)  # fmt: skip
+        self._payloads[(today.date(), True)] = await self._build_shard_message_data(today, True)  # fmt: skip
+
+    async def get_shard_message_data(
+        self,
+        *,
+        date: datetime = MISSING,
+        persistent: bool = True,
+    ) -> dict[str, Any]:
+        date = (date or sky_time_now()).astimezone(SKY_TIMEZONE)
+        key = (date.date(), persistent)
+        cached = self._payloads.get(key)
+        if cached is not None and sky_time_now() < cached.expires:
+            return cached.data
+        payload = await self._build_shard_message_data(date, persistent)
+        if self._in_warm_window(date):
+            self._payloads[key] = payload
+        return payload.data
 
     async def get_live_message_data(self, **kwargs) -> dict[str, Any]:
         return await self.get_shard_message_data(**kwargs)
@@ -191,6 +252,8 @@ async def prefix_shard(self, ctx: commands.Context, *, arg: str):
     async def shard_config_update(self, ctx: commands.Context):
         global shard_cfg
         shard_cfg = await self.get_config()
+        self.config_version += 1
+        await self.refresh_payloads()
         await ctx.message.add_reaction(Emojis("success", "✅"))
 
     @app_commands.command(description="View shards info of today.")
@@ -233,6 +296,37 @@ async def shard_date(
         msg_data = await self.get_shard_message_data(date=date, persistent=False)
         await interaction.followup.send(**msg_data)
 
+    async def get_calendar_image(self, year: int, month: int):
+        key = (year, month, self.config_version)
+        if (image := self._calendar_images.get(key)) is None:
+            # 非自定义表情的奖励单位可以直接作为文字绘制
+            units = {k: v for k in ("Wax", "AC") if isinstance(v := shard_cfg["emojis"][k], str)}  # fmt: skip
+            image = await asyncio.to_thread(
+                render_month_calendar, year, month, shard_cfg["translations"], units
+            )
+            self._calendar_images[key] = image
+        return image
+
+    @group_shard.command(name="calendar", description="View shards calendar of a month.")
+    @app_commands.describe(
+        month="The month (1~12), by default current month.",
+        year="The year (1~9999), by default current year.",
+        private="Only you can see the message, by default True.",
+    )
+    async def shard_calendar(
+        self,
+        interaction: Interaction,
+        month: app_commands.Transform[int, MonthTransformer] | None = None,
+        year: app_commands.Transform[int, YearTransformer] | None = None,
+        private: bool = True,
+    ):
+        await interaction.response.defer(ephemeral=private)
+        now = sky_time_now()
+        month, year = month or now.month, year or now.year
+        image = await self.get_calendar_image(year, month)
+        file = discord.File(io.BytesIO(image), f"shard_calendar_{year:04d}{month:02d}.png")
+        await interaction.followup.send(file=file)
+
     @group_shard.command(name="offset", description="View shards info relative to today.")  # fmt: skip
     @app_commands.describe(
         days="How many days to offset, can be negative.",
@@ -250,6 +344,92 @@ async def shard_offset(
         msg_data = await self.get_shard_message_data(date=date, persistent=False)
         await interaction.followup.send(**msg_data)
 
+    @group_shard.command(name="find", description="Find coming days with specific shards.")
+    @app_commands.describe(
+        type="The shard type, by default any type.",
+        realm="The realm of shard, by default any realm.",
+        map="The map of shard, by default any map.",
+        days="How many days to search from today, by default 30.",
+        private="Only you can see the message, by default True.",
+    )
+    @app_commands.choices(
+        realm=[
+            app_commands.Choice(name=_default_shard_cfg["translations"][r], value=r)
+            for r in realms
+        ],
+        map=[
+            app_commands.Choice(name=_default_shard_cfg["translations"][m], value=m)
+            for m in shard_maps
+        ],
+    )
+    async def shard_find(
+        self,
+        interaction: Interaction,
+        type: ShardType | None = None,
+        realm: str | None = None,
+        map: str | None = None,
+        days: app_commands.Range[int, 1, 365] = 30,
+        private: bool = True,
+    ):
+        await interaction.response.defer(ephemeral=private)
+        now = sky_time_now()
+        infos = get_shard_range(now, now + timedelta(days=days), type=type, realm=realm, map=map)  # fmt: skip
+        if not infos:
+            await interaction.followup.send(
+                embed=fail("No shards found", f"No matching shards in the next {days} days."),
+            )
+            return
+        emojis = shard_cfg["emojis"]
+        trans = shard_cfg["translations"]
+        limit = 10
+        lines = [
+            f"- {timestamp(i.date, 'D')} {emojis[i.type.name]} {trans[i.map]}, {trans[i.realm]}"
+            for i in infos[:limit]
+        ]
+        if len(infos) > limit:
+            lines.append(f"-# And {len(infos) - limit} more...")
+        embed = discord.Embed(
+            color=discord.Color.blurple(),
+            title=f"🔍 Found {len(infos)} shard days in the next {days} days",
+            description="\n".join(lines),
+        )
+        await interaction.followup.send(embed=embed)
+
+    @group_shard.command(name="stats", description="View which memories show up most often.")  # fmt: skip
+    @app_commands.describe(
+        by="Group statistics by map or by weekday, by default map.",
+        private="Only you can see the message, by default True.",
+    )
+    async def shard_memory_stats(
+        self,
+        interaction: Interaction,
+        by: Literal["map", "weekday"] = "map",
+        private: bool = True,
+    ):
+        await interaction.response.defer(ephemeral=private)
+        await shard_stats.ensure_loaded()
+        if not shard_stats.total:
+            await interaction.followup.send(embed=fail("No memory recorded yet"))
+            return
+        trans = shard_cfg["translations"]
+        if by == "map":
+            groups = {trans.get(k, k): v for k, v in shard_stats.by_map.items()}
+        else:
+            groups = {calendar.day_name[k]: v for k, v in sorted(shard_stats.by_weekday.items())}
+        lines = []
+        for name, counter in groups.items():
+            if not counter:
+                continue
+            counts = ", ".join([f"{m.name} ×{n}" for m, n in counter.most_common()])
+            lines.append(f"**{name}**\n{shard_cfg['emojis']['blank']} {counts}")
+        embed = discord.Embed(
+            color=discord.Color.blurple(),
+            title=f"{shard_cfg['emojis']['Memory']} Shard Memory Statistics",
+            description="\n".join(lines),
+        )
+        embed.set_footer(text=f"Based on {shard_stats.total} recorded days since {shard_stats.start:%Y/%m/%d}")  # fmt: skip
+        await interaction.followup.send(embed=embed)
+
     @group_shard.command(name="record", description="Record shards info of a specific date.")  # fmt: skip
     @app_commands.describe(
         memory="Shard memory of the day.",
@@ -298,6 +478,7 @@ async def shard_record(
                 memory_timestamp=interaction.created_at.timestamp(),
             )
             await self.set_extra_info(date, extra)
+            await self.refresh_payloads()
             # 成功记录
             await interaction.followup.send(embed=success("Successfully recorded"))
         except Exception as ex:
@@ -314,11 +495,25 @@ async def get_ready_for_live(self):
 
     @tasks.loop(time=sky_time(0, 0))
     async def refresh_calendar_state(self):
+        # 必要时滚动碎石数据表的范围
+        refresh_shard_table()
         # 每天刚开始时刷新一次碎石消息
         await self.update_live_msg()
         # 然后修改碎石消息的更新时间
         self.set_update_time()
         print(f"[{sky_time_now()}] Sky Calendar state updated.")
+        # 以下任务出错时只记录日志，未捕获的异常会使每天的刷新任务停止
+        try:
+            # 以新的一天为中心重新生成缓存的消息数据，缺少的数据会在使用时生成
+            await self.refresh_payloads()
+        except Exception as ex:
+            print(f"[{sky_time_now()}] Error refreshing shard payloads: {ex}")
+        try:
+            # 将之前月份的记录压缩归档
+            if compacted := await shard_history.compact():
+                print(f"[{sky_time_now()}] Compacted {compacted} shard records into archive.")
+        except Exception as ex:
+            print(f"[{sky_time_now()}] Error compacting shard records: {ex}")
 
 
 class ShardView(ui.LayoutView):
@@ -601,6 +796,7 @@ async def callback(self, interaction: Interaction[SkyM8]):  # type: ignore
             return
         bot = interaction.client
         cog = cast(ShardCalendar, bot.cogs[ShardCalendar.__cog_name__])
+        await cog.refresh_payloads()
         msg_data = await cog.get_shard_message_data(date=self.date, persistent=self.persistent)
         # 更新当前消息
         await interaction.edit_original_response(**msg_data)
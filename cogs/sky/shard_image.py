@@ -0,0 +1,125 @@
+import calendar
+import io
+from math import pi
+
+import cairo
+
+from ..helper.times import sky_datetime
+from .data.shard import ShardType, get_shard_info
+
+__all__ = ("render_month_calendar",)
+
+_CELL_W, _CELL_H = 180, 120
+_MARGIN = 24
+_TITLE_H = 64
+_WEEK_H = 36
+_PAD = 10
+
+# 与ShardView的边框颜色保持一致
+_COLORS = {
+    None: (0xDA, 0xA5, 0x20),
+    ShardType.Black: (0x6A, 0x5A, 0xCD),
+    ShardType.Red: (0xB2, 0x22, 0x22),
+}
+_BACKGROUND = (0x2B, 0x2D, 0x31)
+_FOREGROUND = (0xF2, 0xF3, 0xF5)
+_EMPTY_CELL = (0x38, 0x3A, 0x40)
+
+
+def _rgb(cr: cairo.Context, color: tuple[int, int, int], alpha: float = 1.0):
+    r, g, b = color
+    cr.set_source_rgba(r / 255, g / 255, b / 255, alpha)
+
+
+def _rounded_rect(cr: cairo.Context, x: float, y: float, w: float, h: float, r: float):
+    angle = pi / 2
+    cr.new_sub_path()
+    cr.arc(x + w - r, y + r, r, 3 * angle, 0 * angle)
+    cr.arc(x + w - r, y + h - r, r, 0 * angle, 1 * angle)
+    cr.arc(x + r, y + h - r, r, 1 * angle, 2 * angle)
+    cr.arc(x + r, y + r, r, 2 * angle, 3 * angle)
+    cr.close_path()
+
+
+def _text(
+    cr: cairo.Context,
+    text: str,
+    x: float,
+    y: float,
+    *,
+    size: float,
+    bold: bool = False,
+    max_width: float | None = None,
+    align_right: bool = False,
+):
+    weight = cairo.FONT_WEIGHT_BOLD if bold else cairo.FONT_WEIGHT_NORMAL
+    cr.select_font_face("Sans", cairo.FONT_SLANT_NORMAL, weight)
+    cr.set_font_size(size)
+    # 文字过长时缩小字号
+    width = cr.text_extents(text).x_advance
+    while max_width is not None and width > max_width and size > 8:
+        size -= 1
+        cr.set_font_size(size)
+        width = cr.text_extents(text).x_advance
+    cr.move_to(x - width if align_right else x, y)
+    cr.show_text(text)
+
+
+def render_month_calendar(
+    year: int,
+    month: int,
+    translations: dict[str, str],
+    reward_units: dict[str, str],
+):
+    weeks = calendar.Calendar(firstweekday=0).monthdayscalendar(year, month)
+    width = _MARGIN * 2 + _CELL_W * 7
+    height = _MARGIN * 2 + _TITLE_H + _WEEK_H + _CELL_H * len(weeks)
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+    cr = cairo.Context(surface)
+
+    # 背景和标题
+    _rgb(cr, _BACKGROUND)
+    cr.paint()
+    _rgb(cr, _FOREGROUND)
+    title = f"Shard Calendar - {calendar.month_name[month]} {year}"
+    _text(cr, title, _MARGIN, _MARGIN + 40, size=32, bold=True)
+    # 星期
+    top = _MARGIN + _TITLE_H
+    for i, name in enumerate(calendar.day_abbr):
+        _rgb(cr, _FOREGROUND, 0.7)
+        _text(cr, name, _MARGIN + i * _CELL_W + _PAD, top + 24, size=16, bold=True)
+    top += _WEEK_H
+
+    for row, week in enumerate(weeks):
+        for col, day in enumerate(week):
+            x = _MARGIN + col * _CELL_W + 3
+            y = top + row * _CELL_H + 3
+            w, h = _CELL_W - 6, _CELL_H - 6
+            if day == 0:
+                _rgb(cr, _EMPTY_CELL, 0.5)
+                _rounded_rect(cr, x, y, w, h, 8)
+                cr.fill()
+                continue
+            info = get_shard_info(sky_datetime(year, month, day))
+            _rgb(cr, _COLORS[info.type if info.has_shard else None])
+            _rounded_rect(cr, x, y, w, h, 8)
+            cr.fill()
+
+            _rgb(cr, _FOREGROUND)
+            _text(cr, str(day), x + _PAD, y + 26, size=22, bold=True)
+            if not info.has_shard:
+                _text(cr, "No Shard", x + _PAD, y + h - _PAD, size=16, max_width=w - _PAD * 2)
+                continue
+            unit = reward_units.get(info.reward_type.name, info.reward_type.name)
+            reward = f"{info.reward_number:g} {unit}"
+            _text(cr, reward, x + w - _PAD, y + 24, size=15, bold=True, align_right=True)
+            realm = translations.get(info.realm, info.realm)
+            map = translations.get(info.map, info.map)
+            _text(cr, map, x + _PAD, y + h - _PAD - 24, size=16, bold=True, max_width=w - _PAD * 2)  # fmt: skip
+            _rgb(cr, _FOREGROUND, 0.8)
+            _text(cr, realm, x + _PAD, y + h - _PAD, size=14, max_width=w - _PAD * 2)
+
+    buffer = io.BytesIO()
+    surface.write_to_png(buffer)
+    surface.finish()
+    return buffer.getvalue()
@@ -1,15 +1,17 @@
 import asyncio
+import tempfile
 from datetime import datetime, timedelta
 from typing import Any, cast
 
 import discord
-from discord import ui
+from discord import Interaction, app_commands, ui
 from discord.ext import commands
 from discord.utils import format_dt as timestamp
 
 from sky_m8 import SkyM8
 
 from ..base.live_update import LiveUpdateCog
+from ..helper.cache import LRUCache
 from ..helper.times import sky_time_now
 from .data.clock import (
     ClockEventData,
@@ -19,6 +21,8 @@
     filter_events,
     get_clock_event_time,
 )
+from .data.ics import iter_calendar
+from .shard_calendar import get_shard_config
 
 __all__ = ("SkyClock",)
 
@@ -32,6 +36,11 @@ class SkyClock(
 ):
     def __init__(self, bot: SkyM8):
         super().__init__(bot)
+        # 同一分钟内的内容完全相同，缓存生成的视图供重复请求使用
+        self._view_cache: LRUCache[tuple[datetime, int, bool], SkyClockView] = LRUCache(16)
+
+    def _config_version(self, groups: list[EventGroup], data: dict[str, ClockEventData]):
+        return hash(repr((groups, data)))
 
     async def get_clock_message_data(
         self,
@@ -42,13 +51,21 @@ async def get_clock_message_data(
         when = when or sky_time_now()
         groups = await fetch_displayed_event_groups()
         data = await fetch_all_event_data()
-        available_groups = filter_events(groups, data, when)
-        view = SkyClockView(
-            dt=when,
-            groups=available_groups,
-            data=data,
-            persistent=persistent,
+        key = (
+            when.replace(second=0, microsecond=0),
+            self._config_version(groups, data),
+            persistent,
         )
+        view = self._view_cache.get(key)
+        if view is None:
+            available_groups = filter_events(groups, data, when)
+            view = SkyClockView(
+                dt=when,
+                groups=available_groups,
+                data=data,
+                persistent=persistent,
+            )
+            self._view_cache[key] = view
         return {"view": view}
 
     async def get_live_message_data(self, **kwargs) -> dict[str, Any]:
@@ -66,6 +83,34 @@ async def skyclock(self, ctx: commands.Context, offset: int = 0):
         msg_data = await self.get_clock_message_data(when=date, persistent=False)
         await ctx.send(**msg_data)
 
+    @app_commands.command(
+        name="sky-calendar",
+        description="Export Sky Clock events and shards as a calendar file.",
+    )
+    @app_commands.describe(
+        months="How many months to export, by default 1.",
+        shards="Whether to include shards, by default True.",
+        private="Only you can see the message, by default True.",
+    )
+    async def sky_calendar(
+        self,
+        interaction: Interaction,
+        months: app_commands.Range[int, 1, 12] = 1,
+        shards: bool = True,
+        private: bool = True,
+    ):
+        await interaction.response.defer(ephemeral=private)
+        now = sky_time_now()
+        data = await fetch_all_event_data()
+        translations = get_shard_config()["translations"]
+        chunks = iter_calendar(now, months, data, translations=translations, shards=shards)
+        # 逐块写入临时文件，较大时会自动转存到磁盘，不在内存中拼接整个日历
+        fp = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        await asyncio.to_thread(fp.writelines, chunks)
+        fp.seek(0)
+        file = discord.File(fp, f"sky_calendar_{now:%Y%m%d}.ics")  # type: ignore
+        await interaction.followup.send(file=file)
+
     async def get_ready_for_live(self):
         # 等待到下一个1分钟整
         now = sky_time_now()
@@ -1,9 +1,10 @@
 from sky_m8 import SkyM8
 
-from .timestamp import TimestampMaker
-from .utility import Utility
-
 
 async def setup(bot: SkyM8):
+    # 在setup中再导入各个cog，贴纸处理的子进程和性能测试只导入sticker_maker，不需要加载整个bot
+    from .timestamp import TimestampMaker
+    from .utility import Utility
+
     await bot.add_cog(TimestampMaker(bot))
     await bot.add_cog(Utility(bot))
@@ -0,0 +1,141 @@
+import io
+import zipfile
+from pathlib import PurePosixPath
+
+import aiohttp
+from PIL import Image
+from PIL.Image import Image as PImage
+
+__all__ = (
+    "ImageFetchError",
+    "ImageBudget",
+    "sniff_image",
+    "fetch_image",
+    "open_image",
+    "extract_zip_images",
+)
+
+MAX_BYTES = 20 * 1024 * 1024
+MAX_PIXELS = 4096 * 4096
+MAX_FRAMES = 500
+# 所有帧加起来的像素总数上限，解码为RGBA后约占用4倍字节（256MB）
+# 贴纸最多保留100帧，输出只有320像素，约相当于100帧800x800的图像
+MAX_TOTAL_PIXELS = 64 * 1024 * 1024
+# 压缩包内的图片数量上限，以及解压后的总大小上限
+MAX_ZIP_FILES = 20
+MAX_ZIP_BYTES = 50 * 1024 * 1024
+
+_CHUNK_SIZE = 64 * 1024
+_SNIFF_SIZE = 16
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+def sniff_image(head: bytes):
+    # 根据文件头判断图片格式，不依赖服务器返回的Content-Type
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head.startswith((b"II*\x00", b"MM\x00*")):
+        return "tiff"
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return "avif"
+    return None
+
+
+async def fetch_image(
+    session: aiohttp.ClientSession,
+    url: str,
+    *,
+    proxy: str | None = None,
+    max_bytes: int = MAX_BYTES,
+):
+    # 流式下载，读到文件头时先检查格式，超过大小上限立即中止
+    async with session.get(url, proxy=proxy) as res:
+        if res.status != 200:
+            raise ImageFetchError(f"Request failed: {res.status}")
+        if res.content_length is not None and res.content_length > max_bytes:
+            raise ImageFetchError(f"Image is larger than {max_bytes // 1024 // 1024}MB")
+        data = bytearray()
+        sniffed = False
+        async for chunk in res.content.iter_chunked(_CHUNK_SIZE):
+            data += chunk
+            if len(data) > max_bytes:
+                raise ImageFetchError(f"Image is larger than {max_bytes // 1024 // 1024}MB")
+            if not sniffed and len(data) >= _SNIFF_SIZE:
+                if sniff_image(bytes(data[:_SNIFF_SIZE])) is None:
+                    raise ImageFetchError("Not a supported image")
+                sniffed = True
+        if not sniffed and sniff_image(bytes(data)) is None:
+            raise ImageFetchError("Not a supported image")
+        return bytes(data), res.url.name
+
+
+def open_image(data: bytes):
+    # 只读取文件头信息，在完整解码之前检查尺寸和帧数
+    im: PImage = Image.open(io.BytesIO(data))
+    w, h = im.size
+    if w * h > MAX_PIXELS:
+        raise ImageFetchError(f"Image is too large ({w}x{h})")
+    frames: int = getattr(im, "n_frames", 1)
+    if frames > MAX_FRAMES:
+        raise ImageFetchError(f"Image has too many frames ({frames})")
+    if w * h * frames > MAX_TOTAL_PIXELS:
+        raise ImageFetchError("Animated image is too large")
+    im.seek(0)
+    return im
+
+
+class ImageBudget:
+    # 批量读取时所有附件共用的图片数量和总大小上限，读取每张图片之前先占用额度
+    def __init__(self, max_files: int = MAX_ZIP_FILES, max_bytes: int = MAX_ZIP_BYTES):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.files = 0
+        self.bytes = 0
+
+    @property
+    def remaining_bytes(self):
+        return self.max_bytes - self.bytes
+
+    def reserve(self, name: str, size: int):
+        if size > MAX_BYTES:
+            raise ImageFetchError(f"{name} is larger than {MAX_BYTES // 1024 // 1024}MB")
+        if self.files >= self.max_files:
+            raise ImageFetchError(f"At most {self.max_files} images can be converted at once")
+        if size > self.remaining_bytes:
+            raise ImageFetchError(f"Images are larger than {self.max_bytes // 1024 // 1024}MB in total")  # fmt: skip
+        self.files += 1
+        self.bytes += size
+
+
+def extract_zip_images(data: bytes, suffixes: list[str], budget: ImageBudget | None = None):
+    # 只读取指定后缀的文件，按压缩包内记录的大小检查上限，避免解压炸弹
+    # 传入budget时与其他附件共用上限
+    if budget is None:
+        budget = ImageBudget()
+    images: list[tuple[str, bytes]] = []
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        raise ImageFetchError("Not a valid zip file")
+    with archive:
+        for info in archive.infolist():
+            path = PurePosixPath(info.filename)
+            if info.is_dir() or path.name.startswith(".") or path.suffix[1:].lower() not in suffixes:  # fmt: skip
+                continue
+            budget.reserve(path.name, info.file_size)
+            # 读取时限制长度，防止记录的大小与实际不符
+            with archive.open(info) as f:
+                content = f.read(info.file_size + 1)
+            if len(content) > info.file_size:
+                raise ImageFetchError(f"{path.name} is corrupted")
+            images.append((path.name, content))
+    return images
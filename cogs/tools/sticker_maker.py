@@ -0,0 +1,509 @@
+import io
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from math import pi
+from typing import Any, Iterable, Iterator, Literal, Sequence, overload
+
+import cairo
+import numpy as np
+from PIL import Image, ImageChops, ImageOps, ImageSequence
+from PIL.Image import Image as PImage
+
+from ..helper.cache import LRUCache
+from ..helper.webp import AnimatedWebP
+
+__all__ = (
+    "StickerSource",
+    "MimicStickerMaker",
+    "render_sticker",
+    "fit_animation",
+    "EMOJI_MAX_BYTES",
+)
+
+# 每个进程缓存最近的源图像解码结果，过大的图像不缓存
+_SOURCE_CACHE_SIZE = 2
+_SOURCE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+_source_cache: LRUCache[str, "StickerSource"] = LRUCache(_SOURCE_CACHE_SIZE)
+# 计算包围框时每批处理的帧数，限制临时数组的内存占用
+_BBOX_BATCH = 8
+# 帧数上限，超出时均匀抽帧
+_MAX_FRAMES = 100
+# 每帧最短时长（毫秒），更短的帧会与下一帧合并
+_MIN_DURATION = 20
+# 动画总时长上限（毫秒），超出的部分被截断
+_MAX_DURATION = 15 * 1000
+# 相邻两帧每个通道的最大差值不超过该值时视为相同
+_FRAME_TOLERANCE = 2
+# 圆角遮罩的坐标精度（每像素的份数）
+_MASK_STEPS = 8
+# 预览图的帧数上限和编码参数
+_PREVIEW_FRAMES = 8
+_PREVIEW_QUALITY = 50
+_PREVIEW_METHOD = 0
+# 等待编码的缩略图帧数上限
+_THUMBNAIL_BACKLOG = 2
+# Discord的emoji大小上限
+EMOJI_MAX_BYTES = 256 * 1024
+# 按大小限制编码时的参数：估算使用的帧数、质量档位、编码方法和估算余量
+_FIT_SAMPLE = 8
+_FIT_QUALITIES = tuple(range(10, 95, 5))
+_FIT_METHOD = 6
+_FIT_MARGIN = 0.9
+
+
+def _encode_frame_bytes(frame: PImage, **params: Any):
+    buffer = io.BytesIO()
+    frame.save(buffer, format="WEBP", **params)
+    return buffer.getvalue()
+
+
+def _frames_close(a: np.ndarray, b: np.ndarray):
+    if a.shape != b.shape:
+        return False
+    diff = np.abs(a.astype(np.int16) - b)
+    # 完全透明的像素颜色不可见，不参与比较
+    visible = (a[..., 3] > 0) | (b[..., 3] > 0)
+    diff[..., :3] *= visible[..., None]
+    return int(diff.max()) <= _FRAME_TOLERANCE
+
+
+def _reduce_frames(frames: Iterable[tuple[PImage, int]], count: int):
+    # 合并连续的相同帧和过短的帧，帧数超出上限时均匀抽帧，被合并的帧时长累加到保留的帧上
+    # 总时长超出上限时截断，之后的帧不再解码
+    budget = min(count, _MAX_FRAMES)
+    keep = {i * count // budget for i in range(budget)}
+    pending: PImage | None = None
+    pending_array: np.ndarray | None = None
+    pending_duration = 0
+    elapsed = 0
+    for i, (frame, duration) in enumerate(frames):
+        array: np.ndarray | None = None
+        if pending is not None:
+            if 0 < pending_duration < _MIN_DURATION:
+                # 过短的帧几乎不会被看到，使用之后的帧代替
+                pending, pending_array = frame, None
+                pending_duration += duration
+                continue
+            merge = i not in keep
+            if not merge:
+                if pending_array is None:
+                    pending_array = np.asarray(pending)
+                array = np.asarray(frame)
+                merge = _frames_close(pending_array, array)
+            if merge:
+                pending_duration += duration
+                continue
+            if elapsed + pending_duration >= _MAX_DURATION:
+                break
+            yield pending, pending_duration
+            elapsed += pending_duration
+        pending, pending_array, pending_duration = frame, array, duration
+    if pending is not None:
+        yield pending, min(pending_duration, _MAX_DURATION - elapsed)
+
+
+def _sample_frames(frames: Iterable[tuple[PImage, int]], count: int, budget: int):
+    # 均匀抽取budget帧，未被抽中的帧时长累加到前一个保留的帧上
+    budget = min(count, budget)
+    keep = {i * count // budget for i in range(budget)}
+    pending: PImage | None = None
+    pending_duration = 0
+    for i, (frame, duration) in enumerate(frames):
+        if pending is not None and i not in keep:
+            pending_duration += duration
+            continue
+        if pending is not None:
+            yield pending, pending_duration
+        pending, pending_duration = frame, duration
+    if pending is not None:
+        yield pending, pending_duration
+
+
+def _encode_animation(frames: Sequence[tuple[PImage, int]], loop: int, **params: Any):
+    anim = AnimatedWebP(frames[0][0].size, loop=loop)
+    for f, duration in frames:
+        anim.add_image(f, duration, **params)
+    return anim.getvalue()
+
+
+def fit_animation(frames: Sequence[tuple[PImage, int]], *, loop: int, max_bytes: int):
+    """Encode an animation that fits in max_bytes, lowering quality and then frame rate."""
+    data = b""
+    while True:
+        # 从最多_FIT_SAMPLE帧估算完整动画的大小，在质量档位上二分查找
+        step = max(1, len(frames) // _FIT_SAMPLE)
+        sample = frames[::step]
+        scale = len(frames) / len(sample)
+        target = max_bytes * _FIT_MARGIN
+
+        def estimate(**params: Any):
+            size = sum(len(_encode_frame_bytes(f, **params)) for f, _ in sample)
+            return size * scale
+
+        # 色彩简单的图像无损压缩可能更小
+        if estimate(lossless=True, method=_FIT_METHOD) <= target:
+            data = _encode_animation(frames, loop, lossless=True, method=_FIT_METHOD)
+            if len(data) <= max_bytes:
+                return data
+
+        lo, hi = 0, len(_FIT_QUALITIES) - 1
+        best: int | None = None
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            if estimate(quality=_FIT_QUALITIES[mid], method=_FIT_METHOD) <= target:
+                best, lo = mid, mid + 1
+            else:
+                hi = mid - 1
+        # 估算偏小时降低一档再试一次
+        for i in ([best, best - 1] if best is not None else []):
+            if i < 0:
+                break
+            data = _encode_animation(frames, loop, quality=_FIT_QUALITIES[i], method=_FIT_METHOD)
+            if len(data) <= max_bytes:
+                return data
+
+        # 最低质量仍然超出限制，帧数减半（降低帧率）后重试
+        if len(frames) <= 1:
+            return data
+        frames = list(_sample_frames(frames, len(frames), (len(frames) + 1) // 2))
+
+
+@lru_cache(maxsize=64)
+def _rounded_mask(size: int, x0: int, y0: int, x1: int, y1: int, radius: int):
+    # 参数为量化后的整数，除以_MASK_STEPS得到实际坐标
+    # 返回的图像会被多个请求共用，不能修改
+    x0, y0, x1, y1, radius = [v / _MASK_STEPS for v in (x0, y0, x1, y1, radius)]
+    angle = pi / 2
+    surface = cairo.ImageSurface(cairo.FORMAT_RGB24, size, size)
+    cr = cairo.Context(surface)
+    cr.arc(x0 + radius, y0 + radius, radius, 2 * angle, 3 * angle)
+    cr.arc(x1 - radius, y0 + radius, radius, 3 * angle, 0 * angle)
+    cr.arc(x1 - radius, y1 - radius, radius, 0 * angle, 1 * angle)
+    cr.arc(x0 + radius, y1 - radius, radius, 1 * angle, 2 * angle)
+    cr.close_path()
+    cr.set_source_rgb(1, 1, 1)
+    cr.fill()
+
+    with surface.get_data() as memory:
+        stride = surface.get_stride()
+        mask = Image.frombuffer("RGB", (size, size), memory, "raw", "BGRX", stride, 1)
+        mask = mask.convert("L")
+
+    return mask
+
+
+def _rank_filter(frames: np.ndarray, reduce: np.ufunc, size: int = 5):
+    # 与PIL的MinFilter/MaxFilter相同，边缘像素向外复制后在size×size窗口内取值
+    # 矩形窗口可以拆分为先按行、再按列的一维滑动窗口
+    r = size // 2
+    h, w = frames.shape[1:]
+    padded = np.pad(frames, ((0, 0), (r, r), (r, r)), mode="edge")
+    rows = padded[:, 0:h, :]
+    for d in range(1, size):
+        rows = reduce(rows, padded[:, d : d + h, :])
+    result = rows[:, :, 0:w]
+    for d in range(1, size):
+        result = reduce(result, rows[:, :, d : d + w])
+    return result
+
+
+class StickerSource:
+    # 源图像解码后的帧和包围框，与制作参数无关，可以在多次制作之间复用
+    # 解码后体积较小的图像会保留所有帧，否则每次使用时重新解码，只占用少量帧的内存
+    def __init__(self, im: PImage):
+        self.im = im
+        self.size = im.size
+        self.loop: int = im.info.get("loop", 0)
+        self.transparent = im.has_transparency_data
+        self.n_frames: int = getattr(im, "n_frames", 1)
+        self._frames: list[tuple[PImage, int]] | None = None
+        if self.nbytes <= _SOURCE_CACHE_MAX_BYTES:
+            self._frames = list(self._decode())
+        self._bbox: tuple[int, int, int, int] | None = None
+        self._bbox_done = False
+
+    @property
+    def cacheable(self):
+        return self._frames is not None
+
+    @property
+    def frame_count(self):
+        # 未保留帧时无法提前知道合并后的帧数，使用原始帧数
+        return len(self._frames) if self._frames is not None else self.n_frames
+
+    def _decode(self):
+        im = self.im
+        duration = im.info.get("duration", 500)
+        # 转换为RGBA（原图像可能是palette格式图像，不适合进行插值运算）
+        # APNG的帧时长是浮点数，WebP只能存储整数毫秒
+        frames = (
+            (f.convert("RGBA"), int(round(f.info.get("duration", duration))))
+            for f in ImageSequence.Iterator(im)
+        )
+        yield from _reduce_frames(frames, self.n_frames)
+        im.seek(0)
+
+    def iter_frames(self) -> Iterator[tuple[PImage, int]]:
+        # 逐帧返回 (RGBA帧, 时长)
+        if self._frames is not None:
+            return iter(self._frames)
+        return self._decode()
+
+    @property
+    def nbytes(self):
+        # 所有帧解码为RGBA后的大小
+        w, h = self.size
+        return w * h * 4 * self.n_frames
+
+    def get_bbox(self):
+        if not self._bbox_done:
+            self._bbox = self._get_bbox()
+            self._bbox_done = True
+        return self._bbox
+
+    def _get_bbox(self):
+        # 计算多帧图像共同的包围框，只考虑透明通道
+        # 不含透明通道直接返回完整大小
+        if not self.transparent:
+            return (int(0), int(0), self.size[0], self.size[1])
+
+        # 分批把透明通道叠成数组，对每帧做开运算后取所有帧的最大投影
+        projection = np.zeros((self.size[1], self.size[0]), dtype=bool)
+        frames = self.iter_frames()
+        while batch := [f for f, _ in islice(frames, _BBOX_BATCH)]:
+            alpha = np.stack([np.asarray(f.getchannel("A")) for f in batch])
+            # 形态学开运算，移除透明通道中的噪声
+            eroded = _rank_filter(alpha, np.minimum)
+            opened = _rank_filter(eroded > 0, np.logical_or)
+            projection |= opened.any(axis=0)
+
+        rows = np.flatnonzero(projection.any(axis=1))
+        cols = np.flatnonzero(projection.any(axis=0))
+        if len(rows) == 0:
+            return None
+        bbox = int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+        return bbox
+
+
+class MimicStickerMaker:
+    def __init__(
+        self,
+        *,
+        size: int = 320,
+        auto_crop: bool = True,
+        padding: float = 0.0,
+        roundness: float = 0.0,
+        quality: int = 90,
+        method: int = 4,
+        max_frames: int | None = None,
+    ):
+        self.size = size
+        self.auto_crop = auto_crop
+        self.padding = padding
+        self.roundness = roundness
+        self.quality = quality
+        self.method = method
+        self.max_frames = max_frames
+
+    def _get_rounded_mask(self, coords: Sequence[float], radius: float):
+        # 坐标和半径量化到1/8像素，相近的参数共用同一个遮罩
+        x0, y0, x1, y1 = [round(c * _MASK_STEPS) for c in coords]
+        return _rounded_mask(self.size, x0, y0, x1, y1, round(radius * _MASK_STEPS))
+
+    def _encode_frame(self, frame: PImage):
+        return _encode_frame_bytes(frame, quality=self.quality, method=self.method)
+
+    def _encode_thumbnail(self, frame: PImage):
+        tn = frame.resize((128, 128), resample=Image.Resampling.BICUBIC)
+        return tn, self._encode_frame(tn)
+
+    # fmt: off
+    @overload
+    def make_sticker(self, im: PImage | StickerSource) -> io.BytesIO: ...
+    @overload
+    def make_sticker(self, im: PImage | StickerSource, *, thumbnail: Literal[False]) -> io.BytesIO: ...
+    @overload
+    def make_sticker(self, im: PImage | StickerSource, *, thumbnail: Literal[True]) -> tuple[io.BytesIO, io.BytesIO]: ...
+    # fmt: on
+
+    def make_sticker(self, im: PImage | StickerSource, *, thumbnail: bool = False):
+        # 获取图片信息
+        source = im if isinstance(im, StickerSource) else StickerSource(im)
+        loop = source.loop
+        bbox = (0, 0, source.size[0], source.size[1])
+
+        # 自动裁剪参数
+        if self.auto_crop:
+            bbox = source.get_bbox() or bbox
+
+        # padding参数
+        full_box = bbox  # full_box：padding后的完整图像区域
+        if self.padding != 0:
+            x0, y0, x1, y1 = full_box
+            w, h = x1 - x0, y1 - y0
+            # 计算padding对应的缩放系数并应用到full_box
+            factor = 1 / (1 - self.padding) if self.padding >= 0 else 1 + self.padding
+            w_diff, h_diff = [(s * factor - s) / 2 for s in (w, h)]
+            full_box = x0 - w_diff, y0 - h_diff, x1 + w_diff, y1 + h_diff
+            # 对于放大的情况，需要计算正确的宽和高
+            if self.padding < 0:
+                sx0, sy0, sx1, sy1 = full_box
+                sw, sh = sx1 - sx0, sy1 - sy0
+                if sw > sh:
+                    correct_h = min(h, sw)
+                    diff = (correct_h - sh) / 2
+                    full_box = sx0, sy0 - diff, sx1, sy1 + diff
+                else:
+                    correct_w = min(w, sh)
+                    diff = (correct_w - sw) / 2
+                    full_box = sx0 - diff, sy0, sx1 + diff, sy1
+
+        # roundness参数
+        mask = PImage()
+        if self.roundness > 0:
+            # 计算full_box对应正方形的原点（左上角）
+            fx0, fy0, fx1, fy1 = full_box
+            f_w, f_h = fx1 - fx0, fy1 - fy0
+            if f_w > f_h:
+                origin = fx0, fy0 - (f_w - f_h) / 2
+            else:
+                origin = fx0 - (f_h - f_w) / 2, fy0
+            # 计算圆角矩形区域相对于原点的坐标
+            round_box = full_box if self.padding < 0 else bbox
+            rbox_relative = [b - o for b, o in zip(round_box, origin * 2)]
+            # 缩放到目标尺寸
+            scale = self.size / max(f_w, f_h)
+            round_box = [b * scale for b in rbox_relative]
+            # 圆角半径
+            rx0, ry0, rx1, ry1 = round_box
+            round_radius = min(rx1 - rx0, ry1 - ry0) / 2
+            round_radius *= self.roundness
+            # 绘制圆角矩形遮罩
+            mask = self._get_rounded_mask(round_box, round_radius)
+
+        # 逐帧转换格式并编码，内存中只保留当前帧
+        # 画布向右扩展一倍尺寸的空白，使得贴纸在客户端上显示尺寸缩小
+        sticker = AnimatedWebP((self.size * 2, self.size), loop=loop)
+        tn_sticker = AnimatedWebP((128, 128), loop=loop)
+        data = tn_data = b""
+        duration = 0
+        # 不透明的源图像每帧的透明通道都相同，与遮罩相乘的结果只需计算一次
+        masked_alpha: PImage | None = None
+
+        def transform(f: PImage):
+            nonlocal masked_alpha
+            # padding + resize 到目标尺寸
+            f = f.crop(full_box)
+            f = ImageOps.pad(f, (self.size, self.size))
+            # 应用圆角矩形遮罩
+            if self.roundness > 0:
+                a = masked_alpha
+                if a is None:
+                    a = ImageChops.multiply(f.getchannel("A"), mask)
+                    masked_alpha = None if source.transparent else a
+                f.putalpha(a)
+            return f
+
+        frames: Iterable[tuple[PImage, int]]
+        if self.max_frames is None:
+            frames = ((transform(f), d) for f, d in source.iter_frames())
+        elif source.cacheable:
+            # 已知合并后的帧数，先抽帧，只转换保留的帧
+            sampled = _sample_frames(source.iter_frames(), source.frame_count, self.max_frames)
+            frames = ((transform(f), d) for f, d in sampled)
+        else:
+            # 未保留帧的源图像在解码时才合并帧，无法提前知道帧数
+            # 先转换为目标尺寸的小图保留下来，再按实际帧数抽帧
+            transformed = [(transform(f), d) for f, d in source.iter_frames()]
+            frames = _sample_frames(transformed, len(transformed), self.max_frames)
+        # 缩略图在另一个线程中缩放和编码，与主图像编码同时进行
+        # 两个线程直接共用同一帧图像，WebP编码和缩放时会释放GIL
+        tn_executor = ThreadPoolExecutor(1) if thumbnail else None
+        tn_jobs: deque[tuple[Future[tuple[PImage, bytes]], int]] = deque()
+        # 保留缩略图帧，超出emoji大小限制时重新编码
+        tn_frames: list[tuple[PImage, int]] = []
+
+        def collect_thumbnail():
+            nonlocal tn_data
+            job, tn_duration = tn_jobs.popleft()
+            tn, tn_data = job.result()
+            tn_frames.append((tn, tn_duration))
+            tn_sticker.add_frame(tn_data, tn_duration)
+
+        try:
+            for f, duration in frames:
+                # 创建缩略图
+                if tn_executor is not None:
+                    tn_jobs.append((tn_executor.submit(self._encode_thumbnail, f), duration))
+                data = self._encode_frame(f)
+                sticker.add_frame(data, duration)
+                # 按顺序收集已完成的缩略图帧，积压过多时等待，限制内存中的帧数
+                while tn_jobs and (len(tn_jobs) > _THUMBNAIL_BACKLOG or tn_jobs[0][0].done()):
+                    collect_thumbnail()
+            while tn_jobs:
+                collect_thumbnail()
+        finally:
+            if tn_executor is not None:
+                tn_executor.shutdown(cancel_futures=True)
+
+        # 相同的帧已经在解码时合并，只剩一帧时重复一次才能成为动画，缩略图则使用静态图像
+        # 因为在使用PIL保存WebP图片时，编码算法会将连续重复帧进行优化，导致无法生成多帧图片
+        if len(sticker) == 1:
+            sticker.add_frame(data, duration)
+            tn_buffer = io.BytesIO(tn_data)
+        elif thumbnail:
+            tn_bytes = tn_sticker.getvalue()
+            if len(tn_bytes) > EMOJI_MAX_BYTES:
+                tn_bytes = fit_animation(tn_frames, loop=loop, max_bytes=EMOJI_MAX_BYTES)
+            tn_buffer = io.BytesIO(tn_bytes)
+        else:
+            tn_buffer = io.BytesIO()
+        buffer = io.BytesIO(sticker.getvalue())
+
+        return (buffer, tn_buffer) if thumbnail else buffer
+
+
+def _load_source(data: bytes, key: str):
+    source = _source_cache.get(key)
+    if source is None:
+        source = StickerSource(Image.open(io.BytesIO(data)))
+        if source.cacheable:
+            _source_cache[key] = source
+    return source
+
+
+def render_sticker(
+    data: bytes,
+    *,
+    key: str,
+    size: int,
+    auto_crop: bool,
+    padding: float,
+    roundness: float,
+    preview: bool = False,
+):
+    # 在子进程中运行，输入输出都使用bytes以便跨进程传递
+    # key为源图像的哈希值，用于复用本进程中已解码的帧
+    source = _load_source(data, key)
+    if preview:
+        # 预览图使用一半尺寸、少量帧和最快的编码，不生成缩略图
+        maker = MimicStickerMaker(
+            size=size // 2,
+            auto_crop=auto_crop,
+            padding=padding,
+            roundness=roundness,
+            quality=_PREVIEW_QUALITY,
+            method=_PREVIEW_METHOD,
+            max_frames=_PREVIEW_FRAMES,
+        )
+        return maker.make_sticker(source).getvalue(), b""
+    maker = MimicStickerMaker(
+        size=size,
+        auto_crop=auto_crop,
+        padding=padding,
+        roundness=roundness,
+    )
+    buffer, tn_buffer = maker.make_sticker(source, thumbnail=True)
+    return buffer.getvalue(), tn_buffer.getvalue()
@@ -0,0 +1,97 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+__all__ = (
+    "StickerPool",
+    "StickerPoolFull",
+)
+
+T = TypeVar("T")
+
+# 不使用fork：在运行中的多线程事件循环里fork可能继承被占用的锁，并复制整个bot的内存
+# Windows不支持forkserver，使用spawn
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"  # fmt: skip
+
+
+class StickerPoolFull(Exception):
+    pass
+
+
+class StickerPool:
+    # 在独立进程中运行耗时的图像处理任务，避免阻塞事件循环
+    def __init__(self, *, workers: int = 2, max_queue: int = 8, timeout: float = 60):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = self._create_executor()
+        self._pending = 0
+
+    def _create_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(_START_METHOD),
+        )
+
+    def _reset(self, executor: ProcessPoolExecutor, *, terminate: bool = False):
+        # 子进程异常退出会导致进程池不可用，需要重新创建
+        # 多个任务同时失败时只重建一次
+        if self._executor is not executor:
+            return
+        if terminate:
+            # 结束仍在运行的子进程，其中的任务会以BrokenProcessPool结束并释放名额
+            # shutdown会清空进程列表，需要在此之前结束
+            for process in list((executor._processes or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._create_executor()
+
+    @property
+    def pending(self):
+        # 正在运行和排队中的任务数量
+        return self._pending
+
+    @property
+    def queued(self):
+        # 排队中（还未开始运行）的任务数量
+        return max(0, self._pending - self.workers)
+
+    def _on_done(self, loop: asyncio.AbstractEventLoop, future: Future):
+        # 关闭进程池后任务可能在事件循环关闭之后才结束
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(self._release)
+
+    def _release(self):
+        self._pending -= 1
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        if self._pending >= self.workers + self.max_queue:
+            raise StickerPoolFull()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._executor.submit(partial(fn, *args, **kwargs))
+        except BrokenProcessPool:
+            self._reset(self._executor)
+            future = self._executor.submit(partial(fn, *args, **kwargs))
+        executor = self._executor
+        # 计数在子进程真正结束时才减少
+        self._pending += 1
+        future.add_done_callback(partial(self._on_done, loop))
+        try:
+            # 超时会取消还在排队的任务
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            # 已经开始运行的任务无法取消，结束子进程并重建进程池，同时运行的其他任务也会失败
+            if not future.done():
+                self._reset(executor, terminate=True)
+            raise
+        except BrokenProcessPool:
+            # 任务运行中子进程退出，重建进程池后交给调用方处理
+            self._reset(executor)
+            raise
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,29 +1,41 @@
+import asyncio
+import hashlib
 import io
 import os
 import re
+from concurrent.futures.process import BrokenProcessPool
 from itertools import chain
-from math import pi
 from pathlib import Path
-from typing import Any, Literal, Sequence, TypeAlias, overload
+from typing import Any, TypeAlias
 
 import aiohttp
-import cairo
 import discord
 from discord import Interaction, app_commands, ui
 from discord.ext import commands
-from PIL import Image, ImageChops, ImageFilter, ImageOps, ImageSequence
-from PIL.Image import Image as PImage
-from webptools import webpmux_animate
 
 from sky_m8 import AppUser, SkyM8
 
 from ..base.views import ShortTextModal
 from ..emoji_manager import Emojis
+from ..helper.cache import LRUCache
 from ..helper.embeds import fail, success
+from .image_fetch import (
+    MAX_BYTES,
+    MAX_ZIP_BYTES,
+    ImageBudget,
+    ImageFetchError,
+    extract_zip_images,
+    fetch_image,
+    open_image,
+)
+from .sticker_maker import MimicStickerMaker, render_sticker
+from .sticker_pool import StickerPool, StickerPoolFull
 
 __all__ = ("Utility",)
 
 NoSendChannel: TypeAlias = discord.ForumChannel | discord.CategoryChannel
+StickerKey: TypeAlias = tuple[str, int, bool, float, float]
+StickerCache: TypeAlias = LRUCache[StickerKey, tuple[bytes, bytes]]
 
 _sticker_name_pattern = re.compile(r"^[a-zA-Z0-9_\-\. ]{1,32}$")
 
@@ -89,6 +101,19 @@ class Utility(commands.Cog):
     def __init__(self, bot: SkyM8):
         self.bot = bot
         self._img_types = ["jpg", "jpeg", "png", "webp", "gif", "tiff", "tif", "avif", "avifs"]  # fmt: skip
+        self.sticker_pool = StickerPool()
+        # 制作结果缓存，键为(源图像哈希, 尺寸, 自动裁剪, 边距, 圆角)
+        self.sticker_cache: StickerCache = LRUCache(32)
+        self.http_session: aiohttp.ClientSession = None  # type: ignore
+
+    async def cog_load(self):
+        # 所有下载共用一个连接池
+        timeout = aiohttp.ClientTimeout(total=30)
+        self.http_session = aiohttp.ClientSession(timeout=timeout)
+
+    async def cog_unload(self):
+        self.sticker_pool.shutdown()
+        await self.http_session.close()
 
     def _is_mime_valid(self, mime: str):
         return mime in ["image/" + t for t in self._img_types]
@@ -162,9 +187,10 @@ async def mimic_stickers(
                 return
             # 将文件读取到PIL Image对象
             try:
-                buffer = io.BytesIO()
-                await file.save(buffer)
-                im = Image.open(buffer)
+                if file.size > MAX_BYTES:
+                    raise ImageFetchError(f"Image is larger than {MAX_BYTES // 1024 // 1024}MB")
+                data = await file.read()
+                im = await asyncio.to_thread(open_image, data)
                 im.filename = file.filename
             except Exception as ex:
                 await interaction.followup.send(embed=fail("Invalid file", ex))
@@ -173,34 +199,22 @@ async def mimic_stickers(
             # 从url读取图片到PIL Image对象
             try:
                 proxy = os.getenv("PROXY")
-                async with aiohttp.ClientSession() as cs:
-                    async with cs.get(url, proxy=proxy) as res:  # type: ignore
-                        if res.status != 200:
-                            await interaction.followup.send(
-                                embed=fail(f"Request failed: {res.status}")
-                            )
-                            return
-                        # 检查图片文件格式
-                        if not self._is_mime_valid(res.content_type):
-                            valid_types = ", ".join([f"`{t}`" for t in self._img_types])
-                            await interaction.followup.send(
-                                embed=fail(
-                                    "Format not supported",
-                                    "Only support " + valid_types,
-                                ),
-                            )
-                            return
-                        buffer = io.BytesIO(await res.read())
-                        im = Image.open(buffer)
-                        im.filename = res.url.name
+                data, filename = await fetch_image(self.http_session, url, proxy=proxy)  # type: ignore
+                im = await asyncio.to_thread(open_image, data)
+                im.filename = filename
             except Exception as ex:
                 await interaction.followup.send(embed=fail("Invalid url", ex))
                 return
 
+        pool = self.sticker_pool
+        if pool.pending >= pool.workers:
+            pending_text = f"### ⏳ Queued (position {pool.queued + 1}), please wait..."
+        else:
+            pending_text = "### ⏳ Converting image..."
         pending_view = ui.LayoutView()
         pending_view.add_item(
             ui.Container(
-                ui.TextDisplay("### ⏳ Converting image..."),
+                ui.TextDisplay(pending_text),
                 ui.TextDisplay("This may take a while"),
             )
         )
@@ -217,221 +231,153 @@ async def mimic_stickers(
             padding=padding,
             roundness=roundness,
         )
-        view = MimicStickerMakerView(im, maker, sticker_name, interaction.user)
-        msg_data = view.create_message()
-        await interaction.edit_original_response(**msg_data)
-
+        view = MimicStickerMakerView(
+            data,
+            maker,
+            sticker_name,
+            interaction.user,
+            pool=pool,
+            cache=self.sticker_cache,
+            animated=getattr(im, "n_frames", 1) > 1,
+        )
+        await view.update_message(interaction)
+
+    async def _read_batch_sources(self, files: list[discord.Attachment]):
+        # 读取所有附件，压缩包展开为其中的图片，返回 (文件名, 数据) 列表
+        # 所有附件共用图片数量和总大小上限，超出时在读取更多数据之前中止
+        budget = ImageBudget()
+        sources: list[tuple[str, bytes]] = []
+        for file in files:
+            if Path(file.filename).suffix.lower() == ".zip":
+                # 压缩包中的图片解压后不会比压缩包本身小太多，超出剩余额度时不再下载
+                if file.size > budget.remaining_bytes:
+                    raise ImageFetchError(f"Images are larger than {MAX_ZIP_BYTES // 1024 // 1024}MB in total")  # fmt: skip
+                data = await file.read()
+                sources += await asyncio.to_thread(extract_zip_images, data, self._img_types, budget)  # fmt: skip
+            elif self._is_img_file_valid(file):
+                budget.reserve(file.filename, file.size)
+                sources.append((file.filename, await file.read()))
+            else:
+                raise ImageFetchError(f"{file.filename} is not a supported image or zip file")
+        return sources
 
-class MimicStickerMaker:
-    def __init__(
+    async def _convert_batch_item(
         self,
+        name: str,
+        data: bytes,
+        limiter: asyncio.Semaphore,
         *,
-        size: int = 320,
+        auto_crop: bool,
+        padding: float,
+        roundness: float,
+    ):
+        # 同一张图片在相同设置下的结果直接从缓存读取
+        # 返回 (文件名, 贴纸数据, 错误信息)
+        source_hash = hashlib.sha256(data).hexdigest()
+        key = (source_hash, 320, auto_crop, padding, roundness)
+        if (cached := self.sticker_cache.get(key)) is not None:
+            return name, cached[0], None
+        try:
+            async with limiter:
+                await asyncio.to_thread(open_image, data)
+                result = await self.sticker_pool.run(
+                    render_sticker,
+                    data,
+                    key=source_hash,
+                    size=320,
+                    auto_crop=auto_crop,
+                    padding=padding,
+                    roundness=roundness,
+                )
+        except StickerPoolFull:
+            return name, None, "Too many images are being converted, please try again later."
+        except asyncio.TimeoutError:
+            return name, None, "Converting the image took too long."
+        except BrokenProcessPool:
+            return name, None, "The image converter crashed, please try again."
+        except Exception as ex:
+            return name, None, str(ex)
+        self.sticker_cache[key] = result
+        return name, result[0], None
+
+    @group_utility.command(
+        name="mimic-stickers-batch",
+        description="Make sticker-like images from multiple images or a zip file.",
+    )
+    @app_commands.describe(
+        file1="Image file or zip file of images.",
+        file2="Image file or zip file of images.",
+        file3="Image file or zip file of images.",
+        file4="Image file or zip file of images.",
+        file5="Image file or zip file of images.",
+        auto_crop="Whether to crop empty region around the images, by default True.",
+        padding="Extra padding to image border, creating zoom in (negative) or out (positive) effect, by default 0% (no padding).",
+        roundness="Relative size of rounded corner added to the stickers, by default 0% (no rounded corner)",
+    )
+    @app_commands.choices(
+        padding=StickerPadding.get_choices(),
+        roundness=StickerRoundness.get_choices(),
+    )
+    async def mimic_stickers_batch(
+        self,
+        interaction: Interaction,
+        file1: discord.Attachment,
+        file2: discord.Attachment | None = None,
+        file3: discord.Attachment | None = None,
+        file4: discord.Attachment | None = None,
+        file5: discord.Attachment | None = None,
         auto_crop: bool = True,
-        padding: float = 0.0,
-        roundness: float = 0.0,
+        padding: app_commands.Range[float, -0.5, 0.5] = 0.0,
+        roundness: app_commands.Range[float, 0.0, 1.0] = 0.0,
     ):
-        self.size = size
-        self.auto_crop = auto_crop
-        self.padding = padding
-        self.roundness = roundness
-
-    def _get_bbox(self, im: PImage):
-        # 计算多帧图像共同的包围框，只考虑透明通道
-        # 不含透明通道直接返回完整大小，避免getbbox加载图像
-        if not im.has_transparency_data:
-            return (int(0), int(0), im.size[0], im.size[1])
-
-        bboxes: list[tuple[int, int, int, int]] = []
-        for f in ImageSequence.Iterator(im):
-            f = f.convert("RGBA").getchannel("A")
-            # 形态学开运算，移除透明通道中的噪声
-            f = f.filter(ImageFilter.MinFilter(5)).filter(ImageFilter.MaxFilter(5))
-            b = f.getbbox()
-            if b is not None:
-                bboxes.append(b)
-        im.seek(0)
-        if len(bboxes) == 0:
-            return None
-
-        x0, y0, x1, y1 = list(zip(*bboxes))
-        bbox: tuple[int, int, int, int] = min(x0), min(y0), max(x1), max(y1)
-        return bbox
-
-    def _get_rounded_mask(self, coords: Sequence[float], radius: float):
-        x0, y0, x1, y1 = coords
-        angle = pi / 2
-        surface = cairo.ImageSurface(cairo.FORMAT_RGB24, self.size, self.size)
-        cr = cairo.Context(surface)
-        cr.arc(x0 + radius, y0 + radius, radius, 2 * angle, 3 * angle)
-        cr.arc(x1 - radius, y0 + radius, radius, 3 * angle, 0 * angle)
-        cr.arc(x1 - radius, y1 - radius, radius, 0 * angle, 1 * angle)
-        cr.arc(x0 + radius, y1 - radius, radius, 1 * angle, 2 * angle)
-        cr.close_path()
-        cr.set_source_rgb(1, 1, 1)
-        cr.fill()
-
-        with surface.get_data() as memory:
-            stride = surface.get_stride()
-            mask = Image.frombuffer("RGB", (self.size, self.size), memory, "raw", "BGRX", stride, 1)
-            mask = mask.convert("L")
-
-        return mask
-
-    def _make_singleframe(self, frame: PImage, duration: int, loop: int):
-        # 如果输入是单帧图像，使用webpmux工具合成动画WebP文件，再读取到缓冲区
-        # 因为在使用PIL保存WebP图片时，编码算法会将连续重复帧进行优化，导致无法生成多帧图片
-        frame.save("_temp_frame.webp", quality=90, method=4)
-        # +duration+offset_x+offset_y+dispose+blend
-        # dispose 0: NONE 1: BACKGROUND
-        # blend +b: BLEND -b: NO_BLEND
-        webpmux_animate(
-            [f"_temp_frame.webp +{duration}+0+0+1+b"] * 2,
-            "_temp_sticker.webp",
-            loop=str(loop),
-            bgcolor="0,0,0,0",
-        )
-        with open("_temp_sticker.webp", "rb") as f:
-            buffer = io.BytesIO(f.read())
+        await interaction.response.defer(ephemeral=True)
+        files = [f for f in (file1, file2, file3, file4, file5) if f is not None]
         try:
-            os.remove("_temp_frame.webp")
-            os.remove("_temp_sticker.webp")
-        except Exception:
-            pass
-        return buffer
-
-    def _make_multiframe(self, frames: list[PImage], duration: int, loop: int):
-        # 如果输入是多帧图像，可以直接保存到缓冲区
-        buffer = io.BytesIO()
-        frames[0].save(
-            buffer,
-            format="WEBP",
-            append_images=frames[1:],
-            duration=duration,
-            loop=loop,
-            quality=90,
-            method=4,
-        )
-        return buffer
-
-    def _make_staticframe(self, frame: PImage):
-        # 用于创建单帧缩略图
-        buffer = io.BytesIO()
-        frame.save(
-            buffer,
-            format="WEBP",
-            quality=90,
-            method=4,
-        )
-        return buffer
-
-    def _frames_identical(self, frames: list[PImage]):
-        f0 = frames[0]
-        for f in frames[1:]:
-            diff = ImageChops.difference(f0, f)
-            # 设置alpha_only=False，需要对比所有通道而非只有透明通道
-            if diff.getbbox(alpha_only=False):
-                return False
-        return True
-
-    # fmt: off
-    @overload
-    def make_sticker(self, im: PImage) -> io.BytesIO: ...
-    @overload
-    def make_sticker(self, im: PImage, *, thumbnail: Literal[False]) -> io.BytesIO: ...
-    @overload
-    def make_sticker(self, im: PImage, *, thumbnail: Literal[True]) -> tuple[io.BytesIO, io.BytesIO]: ...
-    # fmt: on
-
-    def make_sticker(self, im: PImage, *, thumbnail: bool = False):
-        # 获取图片信息
-        duration = im.info.get("duration", 500)
-        loop = im.info.get("loop", 0)
-        bbox = (0, 0, im.size[0], im.size[1])
-
-        # 自动裁剪参数
-        if self.auto_crop:
-            bbox = self._get_bbox(im) or bbox
-
-        # padding参数
-        full_box = bbox  # full_box：padding后的完整图像区域
-        if self.padding != 0:
-            x0, y0, x1, y1 = full_box
-            w, h = x1 - x0, y1 - y0
-            # 计算padding对应的缩放系数并应用到full_box
-            factor = 1 / (1 - self.padding) if self.padding >= 0 else 1 + self.padding
-            w_diff, h_diff = [(s * factor - s) / 2 for s in (w, h)]
-            full_box = x0 - w_diff, y0 - h_diff, x1 + w_diff, y1 + h_diff
-            # 对于放大的情况，需要计算正确的宽和高
-            if self.padding < 0:
-                sx0, sy0, sx1, sy1 = full_box
-                sw, sh = sx1 - sx0, sy1 - sy0
-                if sw > sh:
-                    correct_h = min(h, sw)
-                    diff = (correct_h - sh) / 2
-                    full_box = sx0, sy0 - diff, sx1, sy1 + diff
-                else:
-                    correct_w = min(w, sh)
-                    diff = (correct_w - sw) / 2
-                    full_box = sx0 - diff, sy0, sx1 + diff, sy1
-
-        # roundness参数
-        mask = PImage()
-        if self.roundness > 0:
-            # 计算full_box对应正方形的原点（左上角）
-            fx0, fy0, fx1, fy1 = full_box
-            f_w, f_h = fx1 - fx0, fy1 - fy0
-            if f_w > f_h:
-                origin = fx0, fy0 - (f_w - f_h) / 2
-            else:
-                origin = fx0 - (f_h - f_w) / 2, fy0
-            # 计算圆角矩形区域相对于原点的坐标
-            round_box = full_box if self.padding < 0 else bbox
-            rbox_relative = [b - o for b, o in zip(round_box, origin * 2)]
-            # 缩放到目标尺寸
-            scale = self.size / max(f_w, f_h)
-            round_box = [b * scale for b in rbox_relative]
-            # 圆角半径
-            rx0, ry0, rx1, ry1 = round_box
-            round_radius = min(rx1 - rx0, ry1 - ry0) / 2
-            round_radius *= self.roundness
-            # 绘制圆角矩形遮罩
-            mask = self._get_rounded_mask(round_box, round_radius)
-
-        # 每一帧转换格式
-        frames: list[PImage] = []
-        tn_frames: list[PImage] = []
-        for f in ImageSequence.Iterator(im):
-            # 转换为RGBA（原图像可能是palette格式图像，不适合进行插值运算）
-            f = f.convert("RGBA")
-            # padding + resize 到目标尺寸
-            f = f.crop(full_box)
-            f = ImageOps.pad(f, (self.size, self.size))
-            # 应用圆角矩形遮罩
-            if self.roundness > 0:
-                a = f.getchannel("A")
-                a = ImageChops.multiply(a, mask).convert("L")
-                f.putalpha(a)
-            # 创建缩略图
-            if thumbnail:
-                tn = f.resize((128, 128), resample=Image.Resampling.BICUBIC)
-                tn_frames.append(tn)
-            # 向右填充一倍尺寸的空白，使得贴纸在客户端上显示尺寸缩小
-            f = ImageOps.pad(f, (self.size * 2, self.size), centering=(0, 0))
-            frames.append(f)
-
-        # 如果所有帧都相同，则取第一帧并以单帧的方法做处理
-        tn_buffer = io.BytesIO()
-        if len(frames) == 1 or self._frames_identical(frames):
-            buffer = self._make_singleframe(frames[0], duration, loop)
-            if thumbnail:
-                tn_buffer = self._make_staticframe(tn_frames[0])
-        else:
-            buffer = self._make_multiframe(frames, duration, loop)
-            if thumbnail:
-                tn_buffer = self._make_multiframe(tn_frames, duration, loop)
+            sources = await self._read_batch_sources(files)
+        except Exception as ex:
+            await interaction.followup.send(embed=fail("Invalid file", ex))
+            return
+        if not sources:
+            await interaction.followup.send(embed=fail("No images found"))
+            return
 
-        return (buffer, tn_buffer) if thumbnail else buffer
+        total = len(sources)
+        await interaction.followup.send(content=f"⏳ Converting {total} image(s)...")
+        # 每个批量任务最多同时占用进程池的全部工作进程，其余排队等待，不会挤满进程池的队列
+        limiter = asyncio.Semaphore(self.sticker_pool.workers)
+        tasks = [
+            asyncio.create_task(
+                self._convert_batch_item(
+                    name,
+                    data,
+                    limiter,
+                    auto_crop=auto_crop,
+                    padding=padding,
+                    roundness=roundness,
+                )
+            )
+            for name, data in sources
+        ]
+        # 按完成顺序逐个发送结果
+        done = failed = 0
+        for i, task in enumerate(asyncio.as_completed(tasks)):
+            name, sticker, error = await task
+            if sticker is None:
+                failed += 1
+                await interaction.followup.send(
+                    embed=fail(f"Failed to convert {name}", error),
+                    ephemeral=True,
+                )
+            else:
+                done += 1
+                filename = Path(name).stem.replace(" ", "_") + "_sticker.webp"
+                file = discord.File(io.BytesIO(sticker), filename)
+                await interaction.followup.send(file=file, ephemeral=True)
+            status = "✅ Finished" if i + 1 == total else "⏳ Converting"
+            summary = f"{status} {done}/{total} image(s)"
+            if failed:
+                summary += f", {failed} failed"
+            await interaction.edit_original_response(content=summary)
 
 
 class MimicStickerMakerView(ui.LayoutView):
@@ -473,8 +419,7 @@ async def callback(self, interaction: Interaction):
 
             self.label = self.view.sticker_name = name
             # 设置make_new=False，仅改名不需要重新制作图片
-            msg_data = self.view.create_message(make_new=False)
-            await interaction.edit_original_response(**msg_data)
+            await self.view.update_message(interaction, make_new=False)
 
     class CropToggleButton(ui.Button["MimicStickerMakerView"]):
         def __init__(self, value: bool):
@@ -504,8 +449,7 @@ async def callback(self, interaction: Interaction):
             self.view.maker.auto_crop = value
             self.label = self.value_text
             self.emoji = self.value_emoji
-            msg_data = self.view.create_message()
-            await interaction.edit_original_response(**msg_data)
+            await self.view.update_message(interaction)
 
     class PaddingSetting(ui.ActionRow["MimicStickerMakerView"]):
         def __init__(self, value: float):
@@ -524,8 +468,7 @@ async def select_padding(self, interaction: Interaction, select: ui.Select):
 
             self.view.maker.padding = value
             self._update_option(value)
-            msg_data = self.view.create_message()
-            await interaction.edit_original_response(**msg_data)
+            await self.view.update_message(interaction)
 
     class RoundnessSetting(ui.ActionRow["MimicStickerMakerView"]):
         def __init__(self, value: float):
@@ -544,8 +487,7 @@ async def select_roundness(self, interaction: Interaction, select: ui.Select):
 
             self.view.maker.roundness = value
             self._update_option(value)
-            msg_data = self.view.create_message()
-            await interaction.edit_original_response(**msg_data)
+            await self.view.update_message(interaction)
 
     class SendButton(ui.Button["MimicStickerMakerView"]):
         def __init__(self):
@@ -556,6 +498,12 @@ async def callback(self, interaction: Interaction):
             assert self.view is not None
             assert ch is not None and not isinstance(ch, NoSendChannel)
             await interaction.response.defer()
+            if not await self.view.wait_final():
+                await interaction.followup.send(
+                    embed=fail("Image not ready", "Please change a setting to convert it again."),
+                    ephemeral=True,
+                )
+                return
             msg_data = self.view.create_display_message()
             await ch.send(**msg_data)
 
@@ -597,6 +545,13 @@ async def callback(self, interaction: Interaction):
                 )
                 return
 
+            if not await self.view.wait_final():
+                await interaction.followup.send(
+                    embed=fail("Image not ready", "Please change a setting to convert it again."),
+                    ephemeral=True,
+                )
+                return
+
             if self.view.emoji is None:
                 # 创建emoji
                 data = self.view.emoji_buffer.getvalue()
@@ -659,14 +614,26 @@ async def callback(self, interaction: Interaction):
 
     def __init__(
         self,
-        image: PImage,
+        source: bytes,
         maker: MimicStickerMaker,
         sticker_name: str,
         author: AppUser,
+        *,
+        pool: StickerPool,
+        cache: StickerCache,
+        animated: bool = False,
     ):
         super().__init__(timeout=900)
-        self.image = image
+        self.source = source
+        self.source_hash = hashlib.sha256(source).hexdigest()
         self.maker = maker
+        self.pool = pool
+        self.cache = cache
+        # 动图先快速生成预览，再在后台生成完整质量的图像
+        self.animated = animated
+        self.generation = 0  # 每次修改设置加一，用于丢弃过期的后台结果
+        self.final_ready = False
+        self._final_task: asyncio.Task | None = None
         self.buffer = io.BytesIO()
         self.sticker_name = sticker_name
         self.author = author
@@ -676,9 +643,10 @@ def __init__(
         self.emoji_state = 2  # 0: 最新 1: 改名 2: 改图像
 
         self.preview_media = discord.MediaGalleryItem("attachment://" + self.filename)
+        self.text_title = ui.TextDisplay("## Mimic Sticker Maker")
         self.add_item(
             ui.Container(
-                ui.TextDisplay("## Mimic Sticker Maker"),
+                self.text_title,
                 ui.Section(
                     ui.TextDisplay(f"### Making Sticker By\n> {author.mention}"),
                     ui.TextDisplay("-# You can use settings below to edit the image"),
@@ -726,18 +694,111 @@ def emoji_name(self):
             name += "_"
         return name
 
+    def _set_status(self, status: str | None):
+        title = "## Mimic Sticker Maker"
+        self.text_title.content = f"{title}\n-# {status}" if status else title
+
+    def _cache_key(self):
+        maker = self.maker
+        return (self.source_hash, maker.size, maker.auto_crop, maker.padding, maker.roundness)
+
+    async def _run(self, *, preview: bool) -> tuple[bytes, bytes]:
+        maker = self.maker
+        return await self.pool.run(
+            render_sticker,
+            self.source,
+            key=self.source_hash,
+            size=maker.size,
+            auto_crop=maker.auto_crop,
+            padding=maker.padding,
+            roundness=maker.roundness,
+            preview=preview,
+        )
+
+    async def _render(self, interaction: Interaction | None):
+        key = self._cache_key()
+        generation = self.generation
+        # 来回切换设置时直接使用之前的结果
+        if (cached := self.cache.get(key)) is not None:
+            data, emoji_data = cached
+            self.buffer, self.emoji_buffer = io.BytesIO(data), io.BytesIO(emoji_data)
+            self.final_ready = True
+            return
+        # 进程池已满时提示用户正在排队（首次制作时还没有预览图，由调用方提示）
+        if interaction and self.buffer.getbuffer().nbytes and self.pool.pending >= self.pool.workers:  # fmt: skip
+            self._set_status(f"⏳ Queued (position {self.pool.queued + 1}), please wait...")
+            await interaction.edit_original_response(view=self)
+        try:
+            if self.animated and interaction:
+                data, _ = await self._run(preview=True)
+            else:
+                data, emoji_data = await self._run(preview=False)
+        finally:
+            if generation == self.generation:
+                self._set_status(None)
+
+        # 期间设置已被修改，不覆盖新设置的结果（完整图像仍保留在缓存中）
+        if generation != self.generation:
+            if not (self.animated and interaction):
+                self.cache[key] = (data, emoji_data)
+            return
+        if self.animated and interaction:
+            # 先显示预览图，完整图像在后台生成后替换
+            self.buffer = io.BytesIO(data)
+            self.final_ready = False
+            self._set_status("⏳ Preview, rendering full quality...")
+            return
+        self.cache[key] = (data, emoji_data)
+        self.buffer, self.emoji_buffer = io.BytesIO(data), io.BytesIO(emoji_data)
+        self.final_ready = True
+
+    async def _render_final(self, interaction: Interaction, key: StickerKey, generation: int):
+        try:
+            data, emoji_data = await self._run(preview=False)
+        except Exception as ex:
+            if generation == self.generation:
+                self._set_status(None)
+                await interaction.edit_original_response(view=self)
+                await interaction.followup.send(embed=fail("Error", ex), ephemeral=True)
+            return
+        self.cache[key] = (data, emoji_data)
+        # 期间设置已被修改，丢弃结果（结果仍保留在缓存中）
+        if generation != self.generation:
+            return
+        self.buffer, self.emoji_buffer = io.BytesIO(data), io.BytesIO(emoji_data)
+        self.final_ready = True
+        self._set_status(None)
+        self.buffer.seek(0)
+        file = discord.File(self.buffer, self.filename)
+        await interaction.edit_original_response(**self._message_data(file))
+
+    async def wait_final(self):
+        # 发送或创建emoji前需要等待完整质量的图像
+        while self._final_task is not None and not self._final_task.done():
+            await asyncio.wait([self._final_task])
+        return self.final_ready
+
     def _create_file(self, *, make_new=True):
         self.emoji_state = 1
         if make_new:
-            self.buffer, self.emoji_buffer = self.maker.make_sticker(self.image, thumbnail=True)
             self.emoji_state = 2
         self.buffer.seek(0)
         self.emoji_buffer.seek(0)
         file = discord.File(self.buffer, self.filename)
         return file
 
-    def create_message(self, *, make_new=True) -> dict[str, Any]:
+    async def create_message(
+        self,
+        interaction: Interaction | None = None,
+        *,
+        make_new=True,
+    ) -> dict[str, Any]:
+        if make_new:
+            await self._render(interaction)
         file = self._create_file(make_new=make_new)
+        return self._message_data(file)
+
+    def _message_data(self, file: discord.File) -> dict[str, Any]:
         self.preview_media.media.url = file.uri
         return {
             "view": self,
@@ -745,6 +806,44 @@ def create_message(self, *, make_new=True) -> dict[str, Any]:
             "allowed_mentions": discord.AllowedMentions.none(),
         }
 
+    async def update_message(self, interaction: Interaction, *, make_new=True):
+        if make_new:
+            # 取消上一次设置的后台任务，还在排队的任务不会再占用进程池
+            self.generation += 1
+            if self._final_task is not None:
+                self._final_task.cancel()
+                self._final_task = None
+        generation = self.generation
+        try:
+            msg_data = await self.create_message(interaction, make_new=make_new)
+        except StickerPoolFull:
+            await interaction.followup.send(
+                embed=fail("Too busy", "Too many images are being converted, please try again later."),
+                ephemeral=True,
+            )
+            return
+        except asyncio.TimeoutError:
+            await interaction.followup.send(
+                embed=fail("Timed out", "Converting the image took too long."),
+                ephemeral=True,
+            )
+            return
+        except BrokenProcessPool:
+            await interaction.followup.send(
+                embed=fail("Error", "The image converter crashed, please try again."),
+                ephemeral=True,
+            )
+            return
+        # 生成期间设置已被修改，由之后的调用更新消息
+        if generation != self.generation:
+            return
+        await interaction.edit_original_response(**msg_data)
+        # 预览图显示后再开始生成完整图像，保证完整图像最后显示
+        if make_new and not self.final_ready and generation == self.generation:
+            self._final_task = asyncio.create_task(
+                self._render_final(interaction, self._cache_key(), generation)
+            )
+
     def create_display_message(self) -> dict[str, Any]:
         if isinstance(self.author, discord.Member):
             color = self.author.top_role.color
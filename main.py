@@ -4,13 +4,11 @@
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
-from webptools import grant_permission
 
 load_dotenv(override=True)
 
 from sky_m8 import MentionableTree, SkyM8
 
-grant_permission()
 if os.name == "nt":
     policy = asyncio.WindowsSelectorEventLoopPolicy()
     asyncio.set_event_loop_policy(policy)
@@ -27,6 +25,7 @@ async def main():
 
     initial_extensions = [
         "emoji_manager",
+        "member_tracker",
         "info",
         "tools",
         "admin",
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from cogs.tools.sticker_maker import _MAX_DURATION, MimicStickerMaker, _reduce_frames
+
+CORPUS_DIR = Path(__file__).parents[1] / "benchmarks" / "sticker" / "corpus"
+
+
+@pytest.mark.parametrize("name", ["static_small.png", "palette.gif"])
+def test_sticker_margin_is_transparent(name: str):
+    # 不透明的源图像不设置圆角时，贴纸右侧的空白仍然需要是透明的
+    maker = MimicStickerMaker(auto_crop=False, padding=0.0, roundness=0.0)
+    with Image.open(CORPUS_DIR / name) as im:
+        sticker = Image.open(maker.make_sticker(im))
+    assert sticker.size == (maker.size * 2, maker.size)
+    assert sticker.mode == "RGBA"
+    assert sticker.getpixel((maker.size * 3 // 2, maker.size // 2))[3] == 0
+
+
+def _solid(color: tuple[int, int, int, int]):
+    return Image.new("RGBA", (16, 16), color)
+
+
+def test_reduce_frames_folds_short_frame_into_next():
+    # 过短的帧合并到之后的帧，保留之后的图像和累加的时长
+    red, blue = (255, 0, 0, 255), (0, 0, 255, 255)
+    frames = [(_solid(red), 10), (_solid(blue), 500)]
+    reduced = list(_reduce_frames(frames, len(frames)))
+    assert len(reduced) == 1
+    frame, duration = reduced[0]
+    assert frame.getpixel((0, 0)) == blue
+    assert duration == 510
+
+
+def test_reduce_frames_truncates_long_animation():
+    colors = [(i, 0, 0, 255) for i in range(0, 250, 10)]
+    frames = [(_solid(c), 1000) for c in colors]
+    reduced = list(_reduce_frames(frames, len(frames)))
+    assert sum(d for _, d in reduced) == _MAX_DURATION
@@ -8,6 +8,18 @@
 JSONBasic: TypeAlias = str | int | float | bool
 JSONValue: TypeAlias = JSONBasic | list["JSONValue"] | dict[str, "JSONValue"]
 
+# ARGV前一半为字段名，后一半为对应的值
+_DELETE_IF_SCRIPT = """
+local n = #ARGV / 2
+local deleted = 0
+for i = 1, n do
+    if redis.call("HGET", KEYS[1], ARGV[i]) == ARGV[n + i] then
+        deleted = deleted + redis.call("HDEL", KEYS[1], ARGV[i])
+    end
+end
+return deleted
+"""
+
 
 class RemoteConfig:
     def __init__(self):
@@ -22,6 +34,21 @@ async def get_field(self, key: str, field: str):
     async def set_field(self, key: str, field: str, value: Any):
         await self.redis.hset(key, field, value)
 
+    async def get_fields(self, key: str, *fields: str) -> list[Any]:
+        if not fields:
+            return []
+        return await self.redis.hmget(key, *fields)  # type: ignore
+
+    async def get_field_names(self, key: str) -> list[str]:
+        return await self.redis.hkeys(key)  # type: ignore
+
+    async def delete_fields_if(self, key: str, values: dict[str, Any]):
+        # 只删除值仍与给定值相同的字段，比较和删除在同一个脚本中原子执行
+        if not values:
+            return 0
+        fields, expected = list(values), list(values.values())
+        return await self.redis.eval(_DELETE_IF_SCRIPT, [key], fields + expected)
+
     async def get_list(self, key: str):
         return await self.redis.lrange(key, 0, -1)
 